@@ -10,52 +10,198 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
-from os import environ
+import time
+init_start = time.monotonic()
+
+from os import environ, sysconf
 import traceback
 import logging
 import requests
 import json
 from enum import Enum
+from collections import OrderedDict
+from itertools import islice
 import uuid
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
 
-from eth_abi import decode, encode
-import fiona
 import pandas as pd
 import numpy as np
 from numpy.random import Generator, PCG64
-from shapely.geometry.point import Point
-from shapely.strtree import STRtree
-from shapely.geometry import mapping, shape
-from pyproj import Transformer
 from Cryptodome.Hash import SHA512, SHA224
 
 
-logging.basicConfig(level="INFO")
+DAPP_LOG_LEVEL = environ.get("DAPP_LOG_LEVEL","INFO").upper()
+DAPP_LOG_MAX_PAYLOAD = int(environ.get("DAPP_LOG_MAX_PAYLOAD","512")) # 0 disables truncation
+DAPP_LOG_FORMAT = environ.get("DAPP_LOG_FORMAT","text").lower() # text or json (one object per record)
+
+class JsonLogFormatter(logging.Formatter):
+    # Structured records; as in text mode, the message is only built for emitted records
+    def format(self,record):
+        log_record = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        if record.exc_info:
+            log_record['exception'] = self.formatException(record.exc_info)
+        return json.dumps(log_record)
+
+log_handler = logging.StreamHandler()
+if DAPP_LOG_FORMAT == "json":
+    log_handler.setFormatter(JsonLogFormatter())
+logging.basicConfig(level=DAPP_LOG_LEVEL, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
 rollup_server = environ["ROLLUP_HTTP_SERVER_URL"]
-logger.info(f"HTTP rollup_server url is {rollup_server}")
+logger.info("HTTP rollup_server url is %s", rollup_server)
 
 random_seed = 0
 
 bird_contract_address = None
 DAPP_BIRDS_GEO_FILE = environ["DAPP_BIRDS_GEO_FILE"]
 DAPP_BIRDS_FILE = environ["DAPP_BIRDS_FILE"]
+# eager: load geo data before serving; background: load it in a warm-up thread;
+#   lazy: load it on the first birdwatch. Birdwatches always wait for the geo data
+DAPP_GEO_INIT = environ.get("DAPP_GEO_INIT","eager").lower()
+# density: weight encounters by species density only; area: also by the area of
+#   the species region inside the walk, from the tiles file generated by prepare-data.py
+DAPP_ENCOUNTER_MODEL = environ.get("DAPP_ENCOUNTER_MODEL","density").lower()
+DAPP_BIRDS_TILES_FILE = environ.get("DAPP_BIRDS_TILES_FILE")
 
 ENCOUNTER_INTERVAL = 120 # each 2 min
 VISON_RANGE = 10 # 10 meters
+TILE_OVERLAP_SAMPLES = 32 # integration steps of the walk disk and tile overlap
 DUEL_TIMEOUT = 600
+DUEL_TRAITS = ['complete.measures', 'beak.length_culmen', 'beak.length_nares', 'beak.width', 
+    'beak.depth', 'tarsus.length',  'wing.length', 'kipps.distance', 'secondary1', 'hand-wing.index', 
+    'tail.length', 'mass']
+LEADERBOARD_SIZE = 10
+MISSING_TRAIT_RANK = -1 # rank of species with no measure of the trait (set by prepare-data.py)
+MINT_BATCH_SIZE = 32 # max birds minted per mintBatch voucher
+TOURNAMENT_TIMEOUT = 3600 # default duration of each tournament phase (entry, reveal)
+CLAIM_INDEX_TIMEOUT = int(environ.get("DAPP_CLAIM_INDEX_TIMEOUT","86400")) # seconds a claim digest is kept
+CLAIM_INDEX_SIZE = int(environ.get("DAPP_CLAIM_INDEX_SIZE","100000")) # max claim digests kept
+EXPORT_PAGE_SIZE = 100 # default records per export inspect
+EXPORT_BLOCK_SIZE = 1024 # live seqs per block of the export index
+DAPP_EXPORT_FILE = environ.get("DAPP_EXPORT_FILE") # local mode: write exports to this file instead of reports
+DAPP_MEMORY_BUDGET = int(environ.get("DAPP_MEMORY_BUDGET","0")) # RSS bytes that trigger archival of cold records, 0 disables
+DAPP_ARCHIVE_FILE = environ.get("DAPP_ARCHIVE_FILE") # archive region file (e.g. on a flash drive), in memory if not set
+PAGE_SIZE = sysconf("SC_PAGE_SIZE")
+ARCHIVE_MIN_RECORDS = 100 # cold records accumulated before each archival
 
 ###
 # Initialization 
 
-birds_geo = fiona.open(DAPP_BIRDS_GEO_FILE)
 birds_df = pd.read_csv(DAPP_BIRDS_FILE, index_col=[0])
 
-all_shapes = [shape(f['geometry']) for f in birds_geo]
-shapes_tree = STRtree(all_shapes)
+# Species sets are fixed-width bitsets of uint64 words, where bit i is the
+#   species at row i of birds_df (its dense integer code)
+SPECIES_BITSET_WORDS = -(-len(birds_df) // 64)
+
+def species_bitset(mask):
+    bits = np.zeros(SPECIES_BITSET_WORDS * 64, dtype=bool)
+    bits[:len(mask)] = mask
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+def bitset_species(bitset):
+    return np.flatnonzero(np.unpackbits(bitset.view(np.uint8), bitorder='little')[:len(birds_df)])
+
+EMPTY_SPECIES_BITSET = species_bitset([])
+
+species_code_bitsets = {code: species_bitset(birds_df['speciescode'].values == code) for code in birds_df['speciescode'].unique()}
+
+# Geo data (fiona, shapely and pyproj) is only needed by birdwatches
+geo_lock = threading.Lock()
+geo_loaded = False
+Point = None
+birds_geo = None
+shapes_tree = None
+shapes_species_bitsets = None
+transformer = None
+tile_size = None
+species_tiles = None # (tile x, tile y) -> (species rows, coverage fractions)
+
+def load_geo():
+    global geo_loaded, Point, birds_geo, shapes_tree, shapes_species_bitsets, transformer, tile_size, species_tiles
+    with geo_lock:
+        if geo_loaded:
+            return
+        logger.info("Loading geo data")
+        import fiona
+        from shapely.geometry.point import Point
+        from shapely.strtree import STRtree
+        from shapely.geometry import shape
+        from pyproj import Transformer
+
+        birds_geo = fiona.open(DAPP_BIRDS_GEO_FILE)
+
+        all_shapes = []
+        shapes_species_codes = []
+        for f in birds_geo:
+            all_shapes.append(shape(f['geometry']))
+            shapes_species_codes.append(f['properties']['speciescodeEU'])
+        shapes_tree = STRtree(all_shapes)
+
+        # shape index -> bitset of the species living in it
+        shapes_species_bitsets = np.array([species_code_bitsets.get(code, EMPTY_SPECIES_BITSET) for code in shapes_species_codes], dtype=np.uint64) \
+            .reshape(len(shapes_species_codes), SPECIES_BITSET_WORDS)
+
+        transformer = Transformer.from_crs("EPSG:4326","EPSG:3035")
+
+        if DAPP_ENCOUNTER_MODEL == "area":
+            tiles = np.load(DAPP_BIRDS_TILES_FILE)
+            tile_size = float(tiles['tile_size'])
+            order = np.lexsort((tiles['tile_y'], tiles['tile_x']))
+            tile_x = tiles['tile_x'][order]
+            tile_y = tiles['tile_y'][order]
+            tile_species = tiles['species'][order]
+            tile_fraction = tiles['fraction'][order]
+            starts = np.flatnonzero(np.r_[True, (tile_x[1:] != tile_x[:-1]) | (tile_y[1:] != tile_y[:-1])])
+            ends = np.r_[starts[1:], len(tile_x)]
+            species_tiles = {(int(tile_x[i]), int(tile_y[i])): (tile_species[i:j], tile_fraction[i:j]) for i,j in zip(starts,ends)}
+
+        geo_loaded = True
+        logger.info("Geo data loaded")
+
+def disk_tile_overlap(x,y,r,x0,y0,x1,y1):
+    # area of the disk inside the rectangle, integrating the disk chord length along x
+    u0, u1 = max(x0, x - r), min(x1, x + r)
+    if u1 <= u0:
+        return 0.0
+    step = (u1 - u0) / TILE_OVERLAP_SAMPLES
+    u = u0 + (np.arange(TILE_OVERLAP_SAMPLES) + 0.5) * step
+    h = np.sqrt(np.maximum(r * r - (u - x) ** 2, 0))
+    chords = np.minimum(y1, y + h) - np.maximum(y0, y - h)
+    return float(np.clip(chords, 0, None).sum() * step)
+
+def species_area_in_disk(x,y,r):
+    # area of each species region (by birds_df row) inside the disk, from the tile coverage fractions
+    areas = np.zeros(len(birds_df))
+    for tx in range(int(np.floor((x - r) / tile_size)), int(np.floor((x + r) / tile_size)) + 1):
+        for ty in range(int(np.floor((y - r) / tile_size)), int(np.floor((y + r) / tile_size)) + 1):
+            tile = species_tiles.get((tx,ty))
+            if tile is None:
+                continue
+            overlap = disk_tile_overlap(x,y,r,tx*tile_size,ty*tile_size,(tx+1)*tile_size,(ty+1)*tile_size)
+            if overlap > 0:
+                np.add.at(areas, tile[0], tile[1] * overlap)
+    return areas
+
+def warm_up_geo():
+    try:
+        load_geo()
+    except Exception as e:
+        # the first birdwatch will try again and report the error
+        logger.error(f"Error loading geo data: {e}\n{traceback.format_exc()}")
+
+if DAPP_GEO_INIT == "eager":
+    load_geo()
+elif DAPP_GEO_INIT == "background":
+    threading.Thread(target=warm_up_geo, daemon=True).start()
 
-transformer = Transformer.from_crs("EPSG:4326","EPSG:3035")
+# species -> trait -> dense rank (precomputed by prepare-data.py)
+species_trait_ranks = {}
+for species_ranks in birds_df.drop_duplicates('key_0')[['key_0'] + [f"{t}.rank" for t in DUEL_TRAITS]].itertuples(index=False):
+    species_trait_ranks[species_ranks[0]] = dict(zip(DUEL_TRAITS, map(int, species_ranks[1:])))
 
 ###
 # Birds Model 
@@ -74,31 +220,72 @@ class Bird:
     list_by_erc721_id = {} # erc721_id -> bird
 
     def __init__(self,ornithologist,species_name):
-        self.ornithologist = ornithologist
-        self.species_name = species_name
-        self.location = Location.DAPP
-        self.duels = []
-        self.id = str(uuid.uuid4())
-        self.erc721_id = None
+        self.set_state(str(uuid.uuid4()),ornithologist,species_name,Location.DAPP)
         Bird.list_by_id[self.id] = self
         ornithologist = Ornithologist.get_ornithologist(self.ornithologist)
         ornithologist.bird_catalogue[self.id] = self
+        Leaderboard.add(self)
+        StateExport.touch(self)
+        StateExport.touch(ornithologist)
+
+    def set_state(self,bird_id,ornithologist,species_name,location,erc721_id=None,archived_duels=0,archived_wins=0,tournaments=None):
+        self.ornithologist = ornithologist
+        self.species_name = species_name
+        self.location = location
+        self.duels = []
+        self.archived_duels = archived_duels
+        self.archived_wins = archived_wins
+        self.tournaments = tournaments if tournaments is not None else []
+        self.id = bird_id
+        self.erc721_id = erc721_id
+        self.seq = None
+
+    def build(bird_id,ornithologist,species_name,location,erc721_id=None,archived_duels=0,archived_wins=0,tournaments=None):
+        # a bird from its state, not registered in the model yet
+        bird = Bird.__new__(Bird)
+        bird.set_state(bird_id,ornithologist,species_name,location,erc721_id,archived_duels,archived_wins,tournaments)
+        return bird
 
     def get_traits(self):
         return birds_df.loc[birds_df['key_0'] == self.species_name].to_dict('records')[0]
 
+    def get_trait_rank(self,trait):
+        return species_trait_ranks[self.species_name][trait]
+
     def __str__(self):
         bird_dict = self.get_traits()
         bird_dict['id'] = self.id
         bird_dict['erc721_id'] = self.erc721_id
         bird_dict['location'] = self.location
         bird_dict['ornithologist'] = self.ornithologist
-        bird_dict['duels'] = len(self.duels)
-        bird_dict['wins'] = len(list(filter(lambda d: d.winner == self.id, self.duels)))
+        bird_dict['duels'] = len(self.duels) + self.archived_duels
+        bird_dict['wins'] = len(list(filter(lambda d: d.winner == self.id, self.duels))) + self.archived_wins
+        bird_dict['tournaments'] = len(self.tournaments)
+        bird_dict['tournament_wins'] = len(list(filter(lambda t: t.winner == self.id, self.tournaments)))
         return str(bird_dict)
 
     def __repr__(self):
         return self.__str__()
+
+    def to_export_dict(self):
+        return {'type': 'bird', 'seq': self.seq, 'id': self.id, 'species': self.species_name, 'erc721_id': self.erc721_id, \
+            'location': self.location.name, 'ornithologist': self.ornithologist, 'duels': len(self.duels) + self.archived_duels, \
+            'wins': len(list(filter(lambda d: d.winner == self.id, self.duels))) + self.archived_wins, 'tournaments': len(self.tournaments), \
+            'tournament_wins': len(list(filter(lambda t: t.winner == self.id, self.tournaments)))}
+
+    def to_archive_dict(self):
+        archive_dict = self.to_export_dict()
+        archive_dict['tournament_ids'] = [t.id for t in self.tournaments]
+        return archive_dict
+
+    def restore(archive_dict):
+        # bring an archived (withdrawn) bird back to memory
+        bird = Bird.build(archive_dict['id'],None,archive_dict['species'],Location.BASE_LAYER,archive_dict['erc721_id'], \
+            archive_dict['duels'],archive_dict['wins'],[Tournament.list_by_id[t] for t in archive_dict['tournament_ids']])
+        Bird.list_by_id[bird.id] = bird
+        if bird.erc721_id is not None:
+            Bird.list_by_erc721_id[bird.erc721_id] = bird
+        return bird
         
     def withdraw(self):
         voucher = None
@@ -113,11 +300,40 @@ class Bird:
             voucher = create_erc721_safetransfer_voucher(bird_contract_address,rollup_address,self.ornithologist,self.erc721_id)
 
         if voucher:
-            ornithologist = Ornithologist.get_ornithologist(self.ornithologist)
-            del ornithologist.bird_catalogue[self.id]
-            self.ornithologist = None
-            self.location = Location.BASE_LAYER
-            logger.info(f"voucher {voucher}")
+            self.move_to_base_layer()
+            logger.info("voucher %s", LazyLog(voucher))
+            send_voucher(voucher)
+
+    def move_to_base_layer(self):
+        ornithologist = Ornithologist.get_ornithologist(self.ornithologist)
+        del ornithologist.bird_catalogue[self.id]
+        Leaderboard.remove(self)
+        self.ornithologist = None
+        self.location = Location.BASE_LAYER
+        StateExport.touch(self)
+        StateExport.touch(ornithologist)
+        Archive.cold_birds[self.id] = self
+
+    def withdraw_batch(receiver,birds):
+        if bird_contract_address is None:
+            raise Exception("bird_contract_address not yet defined")
+
+        vouchers = []
+        # birds not minted yet are minted together
+        to_mint = [bird.id for bird in birds if bird.erc721_id is None]
+        for i in range(0,len(to_mint),MINT_BATCH_SIZE):
+            vouchers.append(create_erc721_mint_batch_voucher(bird_contract_address,receiver,to_mint[i:i+MINT_BATCH_SIZE]))
+
+        # deposited birds are transfered one by one
+        for bird in birds:
+            if bird.erc721_id is not None:
+                vouchers.append(create_erc721_safetransfer_voucher(bird_contract_address,rollup_address,receiver,bird.erc721_id))
+
+        for bird in birds:
+            bird.move_to_base_layer()
+
+        for voucher in vouchers:
+            logger.info("voucher %s", LazyLog(voucher))
             send_voucher(voucher)
 
     def get_encountered_summary():
@@ -127,33 +343,42 @@ class Bird:
             if species_encountered.get(v.species_name) is None:
                 species_encountered[v.species_name] = 0
             species_encountered[v.species_name] += 1
+        for species_name,count in Archive.archived_species.items():
+            species_encountered[species_name] = species_encountered.get(species_name, 0) + count
         # birds_df.loc[birds_df['key_0'] in species_encountered.keys()].to_dict('records')
         return str(species_encountered)
 
     def deposit(depositor,token_id):
-        bird = Bird.list_by_erc721_id.get(token_id)
+        bird = Bird.list_by_erc721_id.get(token_id) or Archive.restore_bird(Archive.get_bird_id_by_erc721_id(token_id))
         if not bird:
             raise Exception("Bird not found, no erc721 id registered")
+        Archive.cold_birds.pop(bird.id, None)
         bird.ornithologist = depositor
         ornithologist = Ornithologist.get_ornithologist(bird.ornithologist)
         ornithologist.bird_catalogue[bird.id] = bird
         bird.location = Location.DAPP
+        Leaderboard.add(bird)
+        StateExport.touch(bird)
+        StateExport.touch(ornithologist)
         return bird
 
     def register_erc721_id(bird_id,token_id):
         bird = Bird.list_by_id.get(bird_id)
         if not bird:
-            raise Exception("Bird not found")
+            # archived birds stay in the archive, only their record is updated
+            archived_bird = Archive.register_erc721_id(bird_id,token_id)
+            if not archived_bird:
+                raise Exception("Bird not found")
+            return archived_bird
         bird.erc721_id = token_id
         Bird.list_by_erc721_id[token_id] = bird
+        StateExport.touch(bird)
         return bird
 
 
 class Duel:
     list_by_id = {} # id -> duel
-    accepted_traits = ['complete.measures', 'beak.length_culmen', 'beak.length_nares', 'beak.width', 
-        'beak.depth', 'tarsus.length',  'wing.length', 'kipps.distance', 'secondary1', 'hand-wing.index', 
-        'tail.length', 'mass']
+    accepted_traits = DUEL_TRAITS
 
     def __init__(self,timestamp,ornithologist1,ornithologist2,ornithologist1_commit,trait,compare_greater=True):
         ornithologist1_obj = Ornithologist.get_ornithologist(ornithologist1)
@@ -171,6 +396,8 @@ class Duel:
         self.timestamp = timestamp
         self.winner = None
         self.winner_ornithologist = None
+        self.finished = False
+        self.seq = None
 
         if not trait in Duel.accepted_traits:
             raise Exception("Trait not accepted to duels")
@@ -192,7 +419,7 @@ class Duel:
         return_dict = { 'id': self.id, 'ornithologist1':self.ornithologist1, 'ornithologist2':self.ornithologist2, 'winner':self.winner, \
             'winner_ornithologist':self.winner_ornithologist, 'timestamp': self.timestamp, 'bird1_id':self.bird1_id, 'bird2_id':self.bird2_id, \
             'trait':self.trait, 'compare_greater':self.compare_greater}
-        if self.winner:
+        if self.finished:
             return_dict['status'] = 'finished'
         elif self.bird2_id:
             return_dict['status'] = f"waiting ornithologist 1 ({self.ornithologist1}) reveal"
@@ -203,6 +430,11 @@ class Duel:
     def __repr__(self):
         return self.__str__()
 
+    def to_export_dict(self):
+        return {'type': 'duel', 'seq': self.seq, 'id': self.id, 'ornithologist1': self.ornithologist1, 'ornithologist2': self.ornithologist2, \
+            'winner': self.winner, 'winner_ornithologist': self.winner_ornithologist, 'timestamp': self.timestamp, \
+            'bird1_id': self.bird1_id, 'bird2_id': self.bird2_id, 'trait': self.trait, 'compare_greater': self.compare_greater}
+
     def cancel(self):
         if not (self.bird2_id is None):
             raise Exception("Can not cancel if ornithologist 2 has already chosen bird")
@@ -232,9 +464,7 @@ class Duel:
         self.resolve_duel(timestamp,winner)
         
     def check_bird_reveal(self,chosen_bird,nonce):
-        bird_nonce = f"{chosen_bird}-{nonce}"
-        h = SHA512.new(truncate="256", data=str2binary(bird_nonce))
-        if h.hexdigest() != self.ornithologist1_commit:
+        if bird_commit_hash(chosen_bird,nonce) != self.ornithologist1_commit:
             return False
 
         bird1 = Bird.list_by_id.get(chosen_bird)
@@ -270,25 +500,33 @@ class Duel:
         bird1 = Bird.list_by_id.get(self.bird1_id)
         bird2 = Bird.list_by_id.get(self.bird2_id)
         
-        bird1_traits = bird1.get_traits()
-        bird2_traits = bird2.get_traits()
+        bird1_rank = bird1.get_trait_rank(self.trait)
+        bird2_rank = bird2.get_trait_rank(self.trait)
 
         winner = None
-        if bird1_traits[self.trait] == bird2_traits[self.trait]:
+        if bird1_rank == MISSING_TRAIT_RANK or bird2_rank == MISSING_TRAIT_RANK:
+            # a missing measure forfeits (as in tournaments), a draw if both are missing
+            if bird1_rank != MISSING_TRAIT_RANK:
+                winner = bird1
+            elif bird2_rank != MISSING_TRAIT_RANK:
+                winner = bird2
+        elif bird1_rank == bird2_rank:
             pass
-        elif (self.compare_greater and bird1_traits[self.trait] > bird2_traits[self.trait]) or \
-                (not self.compare_greater and bird1_traits[self.trait] < bird2_traits[self.trait]): 
+        elif (self.compare_greater and bird1_rank > bird2_rank) or \
+                (not self.compare_greater and bird1_rank < bird2_rank): 
             winner = bird1
         else: 
             winner = bird2
 
-        return winner.id
+        return winner.id if winner else None
 
     def resolve_duel(self,timestamp,winner):
+        # winner is None on a draw
         self.timestamp = timestamp
         self.winner = winner
-        winner_bird = Bird.list_by_id.get(self.winner)
-        self.winner_ornithologist = winner_bird.ornithologist
+        self.finished = True
+        winner_bird = Bird.list_by_id.get(self.winner) if self.winner else None
+        self.winner_ornithologist = winner_bird.ornithologist if winner_bird else None
 
         bird1 = Bird.list_by_id.get(self.bird1_id)
         bird2 = Bird.list_by_id.get(self.bird2_id)
@@ -296,6 +534,8 @@ class Duel:
         if (bird1 is not None) and (bird2 is not None):
             bird1.duels.append(self)
             bird2.duels.append(self)
+            StateExport.touch(bird1)
+            StateExport.touch(bird2)
 
         ornithologist1_object = Ornithologist.get_ornithologist(self.ornithologist1)
         ornithologist2_object = Ornithologist.get_ornithologist(self.ornithologist2)
@@ -303,8 +543,12 @@ class Duel:
         ornithologist2_object.duels.append(self)
         del ornithologist1_object.unfinished_duels[self.id]
         del ornithologist2_object.unfinished_duels[self.id]
+        StateExport.touch(ornithologist1_object)
+        StateExport.touch(ornithologist2_object)
 
         del Duel.list_by_id[self.id]
+        StateExport.touch(self)
+        Archive.cold_duels.append(self)
 
     def generate_duel_id(ornithologist_a, ornithologist_b):
         if ornithologist_a.lower() == ornithologist_b.lower():
@@ -314,30 +558,472 @@ class Duel:
         return SHA224.new(data=str2binary(ornithologists_str)).hexdigest()[:10]
 
 
+class Tournament:
+    list_by_id = {} # id -> tournament
+
+    def __init__(self,timestamp,creator,trait,compare_greater=True,entry_timeout=TOURNAMENT_TIMEOUT,reveal_timeout=TOURNAMENT_TIMEOUT):
+        if not trait in Duel.accepted_traits:
+            raise Exception("Trait not accepted to duels")
+        if entry_timeout <= 0 or reveal_timeout <= 0:
+            raise Exception("Tournament timeouts must be positive")
+
+        self.creator = creator
+        self.trait = trait
+        self.compare_greater = compare_greater
+        self.timestamp = timestamp
+        self.entry_deadline = timestamp + entry_timeout
+        self.reveal_deadline = self.entry_deadline + reveal_timeout
+        self.commits = {} # ornithologist -> commit
+        self.revealed = {} # ornithologist -> bird id
+        self.scores = None # bird id -> wins
+        self.winner = None
+        self.winner_ornithologist = None
+        self.seq = None
+        self.id = SHA224.new(data=str2binary(f"{creator.lower()}-{timestamp}-{trait}")).hexdigest()[:10]
+
+        if Tournament.list_by_id.get(self.id):
+            raise Exception("Tournament already exists")
+        Tournament.list_by_id[self.id] = self
+
+    def __str__(self):
+        return_dict = {'id': self.id, 'creator': self.creator, 'trait': self.trait, 'compare_greater': self.compare_greater, \
+            'entry_deadline': self.entry_deadline, 'reveal_deadline': self.reveal_deadline, 'entrants': len(self.commits), \
+            'revealed': self.revealed, 'winner': self.winner, 'winner_ornithologist': self.winner_ornithologist, 'scores': self.scores}
+        # the phase of an open tournament depends on the current time, compare it to the deadlines
+        return_dict['status'] = 'finished' if self.scores is not None else 'open'
+        return str(return_dict)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def to_export_dict(self):
+        return {'type': 'tournament', 'seq': self.seq, 'id': self.id, 'creator': self.creator, 'trait': self.trait, \
+            'compare_greater': self.compare_greater, 'timestamp': self.timestamp, 'revealed': self.revealed, \
+            'winner': self.winner, 'winner_ornithologist': self.winner_ornithologist, 'scores': self.scores}
+
+    def add_entry(self,timestamp,ornithologist,commit):
+        if timestamp >= self.entry_deadline:
+            raise Exception("Tournament entry period is over")
+        if self.commits.get(ornithologist):
+            raise Exception("Ornithologist already entered this tournament")
+        if len(Ornithologist.get_ornithologist(ornithologist).bird_catalogue) == 0:
+            raise Exception("Sender ornithologist bird catalogue is empty")
+        self.commits[ornithologist] = commit
+
+    def add_reveal(self,timestamp,ornithologist,chosen_bird,nonce):
+        if timestamp < self.entry_deadline:
+            raise Exception("Tournament entry period is not over yet")
+        if timestamp >= self.reveal_deadline:
+            raise Exception("Tournament reveal period is over")
+        commit = self.commits.get(ornithologist)
+        if not commit:
+            raise Exception("Ornithologist not in this tournament")
+        if self.revealed.get(ornithologist):
+            raise Exception("Ornithologist already revealed")
+        if bird_commit_hash(chosen_bird,nonce) != commit:
+            raise Exception("Bird and nonce do not match the commit")
+        bird = Bird.list_by_id.get(chosen_bird)
+        if not bird:
+            raise Exception("Bird not found")
+        if bird.ornithologist != ornithologist:
+            raise Exception("Bird current ornithologist is not sender")
+        self.timestamp = timestamp
+        self.revealed[ornithologist] = bird.id
+
+    def resolve(self,timestamp):
+        if self.scores is not None:
+            raise Exception("Tournament already finished")
+        if timestamp < self.reveal_deadline:
+            raise Exception("Can not resolve tournament before the reveal deadline")
+        self.timestamp = timestamp
+
+        # entrants whose bird left the DApp (or changed owner) after the reveal,
+        #   or whose bird species has no measure of the trait, forfeit
+        birds = [Bird.list_by_id.get(b) for b in self.revealed.values()]
+        birds = [b for b in birds if b is not None and b.ornithologist is not None and self.revealed.get(b.ornithologist) == b.id \
+            and b.get_trait_rank(self.trait) != MISSING_TRAIT_RANK]
+
+        # round-robin: the wins of each bird are the number of birds it beats, counted
+        #   with a binary search in the sorted ranks (O(n log n), no n x n comparison matrix)
+        ranks = np.array([b.get_trait_rank(self.trait) for b in birds], dtype=np.int64)
+        sorted_ranks = np.sort(ranks)
+        if self.compare_greater:
+            wins = np.searchsorted(sorted_ranks, ranks, side='left')
+        else:
+            wins = len(ranks) - np.searchsorted(sorted_ranks, ranks, side='right')
+        self.scores = dict(zip([b.id for b in birds], wins.tolist()))
+
+        # a winner needs at least two valid entrants, and a tie for most wins is a draw (no winner), as in duels
+        if len(birds) > 1 and np.count_nonzero(wins == wins.max()) == 1:
+            winner_bird = birds[int(np.argmax(wins))]
+            self.winner = winner_bird.id
+            self.winner_ornithologist = winner_bird.ornithologist
+
+        for bird in birds:
+            bird.tournaments.append(self)
+            StateExport.touch(bird)
+        for ornithologist in self.commits:
+            ornithologist_object = Ornithologist.get_ornithologist(ornithologist)
+            ornithologist_object.tournaments.append(self)
+            StateExport.touch(ornithologist_object)
+        StateExport.touch(self)
+
+
+class ClaimIndex:
+    # Recent birdwatch claims, to reject summaries relayed more than once.
+    #   Inputs arrive in timestamp order, so the oldest digests are always first
+    list_by_digest = OrderedDict() # digest -> input timestamp
+
+    def get_digest(summary):
+        canonical_summary = dict(summary)
+        canonical_summary['a'] = str(canonical_summary.get('a')).lower()
+        summary_str = json.dumps(canonical_summary, sort_keys=True, separators=(',',':'))
+        return SHA224.new(data=str2binary(summary_str)).digest()
+
+    def expire(timestamp):
+        while len(ClaimIndex.list_by_digest) > 0:
+            oldest_timestamp = next(iter(ClaimIndex.list_by_digest.values()))
+            if oldest_timestamp + CLAIM_INDEX_TIMEOUT > timestamp and len(ClaimIndex.list_by_digest) < CLAIM_INDEX_SIZE:
+                break
+            ClaimIndex.list_by_digest.popitem(last=False)
+
+    def is_duplicated(digest,timestamp):
+        ClaimIndex.expire(timestamp)
+        return digest in ClaimIndex.list_by_digest
+
+    def add(digest,timestamp):
+        ClaimIndex.list_by_digest[digest] = timestamp
+
+
 class Ornithologist:
     list_by_id = {} # address -> ornithologist
     def __init__(self,address):
         self.address = address
         self.duels = []
+        self.archived_duels = 0
+        self.archived_wins = 0
+        self.tournaments = []
         self.unfinished_duels = {}
         self.bird_catalogue = {}
+        self.seq = None
         Ornithologist.list_by_id[address] = self
+        StateExport.touch(self)
 
     def __str__(self):
         return_dict = {'ornithologist': self.address, 'unfinished_duels': self.unfinished_duels, 'bird_catalogue': self.bird_catalogue}
-        return_dict['duels'] = len(self.duels)
-        return_dict['wins'] = len(list(filter(lambda d: d.winner_ornithologist == self.address, self.duels)))
+        return_dict['duels'] = len(self.duels) + self.archived_duels
+        return_dict['wins'] = len(list(filter(lambda d: d.winner_ornithologist == self.address, self.duels))) + self.archived_wins
+        return_dict['tournaments'] = len(self.tournaments)
+        return_dict['tournament_wins'] = len(list(filter(lambda t: t.winner_ornithologist == self.address, self.tournaments)))
         return str(return_dict)
 
     def __repr__(self):
         return self.__str__()
 
+    def to_export_dict(self):
+        # bird ownership is exported in the bird records, so the record size does not grow with the catalogue
+        return {'type': 'ornithologist', 'seq': self.seq, 'address': self.address, 'birds': len(self.bird_catalogue), \
+            'duels': len(self.duels) + self.archived_duels, \
+            'wins': len(list(filter(lambda d: d.winner_ornithologist == self.address, self.duels))) + self.archived_wins, \
+            'tournaments': len(self.tournaments), \
+            'tournament_wins': len(list(filter(lambda t: t.winner_ornithologist == self.address, self.tournaments)))}
+
     def get_ornithologist(ornithologist_address):
         ornithologist = Ornithologist.list_by_id.get(ornithologist_address)
         if not ornithologist:
             ornithologist = Ornithologist(ornithologist_address)
         return ornithologist
 
+
+class Leaderboard:
+    # Ranks are dense integers below the number of species, so the birds in DApp are bucketed
+    #   by rank: adding or removing a bird is O(1) per trait, and a query walks at most
+    #   the number of ranks (not of birds) plus the entries returned
+    list_by_trait = {trait: [{} for _ in range(max(r[trait] for r in species_trait_ranks.values()) + 1)] \
+        for trait in DUEL_TRAITS} # trait -> rank -> bird id -> bird, in arrival order
+    size_by_trait = {trait: 0 for trait in DUEL_TRAITS}
+
+    def add(bird):
+        # species with no measure of a trait are left out of its leaderboard
+        for trait in DUEL_TRAITS:
+            rank = bird.get_trait_rank(trait)
+            if rank != MISSING_TRAIT_RANK and bird.id not in Leaderboard.list_by_trait[trait][rank]:
+                Leaderboard.list_by_trait[trait][rank][bird.id] = bird
+                Leaderboard.size_by_trait[trait] += 1
+
+    def remove(bird):
+        for trait in DUEL_TRAITS:
+            rank = bird.get_trait_rank(trait)
+            if rank != MISSING_TRAIT_RANK and Leaderboard.list_by_trait[trait][rank].pop(bird.id, None) is not None:
+                Leaderboard.size_by_trait[trait] -= 1
+
+    def iter_entries(trait,ranks):
+        for rank in ranks:
+            for bird in Leaderboard.list_by_trait[trait][rank].values():
+                yield {'bird': bird.id, 'species': bird.species_name, 'ornithologist': bird.ornithologist, 'rank': rank}
+
+    def get_leaderboard(trait,size=LEADERBOARD_SIZE):
+        if not trait in Leaderboard.list_by_trait:
+            raise Exception("Trait not accepted to duels")
+        ranks = range(len(Leaderboard.list_by_trait[trait]))
+        return_dict = {'trait': trait, 'birds': Leaderboard.size_by_trait[trait]}
+        return_dict['highest'] = list(islice(Leaderboard.iter_entries(trait,reversed(ranks)), max(size, 0)))
+        return_dict['lowest'] = list(islice(Leaderboard.iter_entries(trait,ranks), max(size, 0)))
+        return str(return_dict)
+
+class StateExport:
+    # Each mutation of a bird, ornithologist, finished duel or finished tournament
+    #   gives it a new sequence number, so exports can be incremental (records with seq > since).
+    #   The live seqs are kept sorted in blocks of at most EXPORT_BLOCK_SIZE, so a page seeks
+    #   its first record with two binary searches, and a superseded seq is removed from its block
+    seq = 0
+    list_by_seq = {} # latest seq -> record
+    seq_blocks = [array('Q')] # sorted blocks of the live seqs
+    block_firsts = [0] # first seq of each block
+
+    def add_seq(seq):
+        # seqs only grow, so they are always appended to the last block
+        if len(StateExport.seq_blocks[-1]) >= EXPORT_BLOCK_SIZE:
+            StateExport.seq_blocks.append(array('Q'))
+            StateExport.block_firsts.append(seq)
+        StateExport.seq_blocks[-1].append(seq)
+
+    def remove_seq(seq):
+        b = bisect_right(StateExport.block_firsts, seq) - 1
+        block = StateExport.seq_blocks[b]
+        del block[bisect_left(block, seq)]
+        if len(block) > 0:
+            StateExport.block_firsts[b] = block[0]
+        elif len(StateExport.seq_blocks) > 1:
+            del StateExport.seq_blocks[b]
+            del StateExport.block_firsts[b]
+
+    def touch(record):
+        if record.seq is not None:
+            # restored birds still have the seq of their archived record
+            StateExport.list_by_seq.pop(record.seq, None)
+            StateExport.remove_seq(record.seq)
+        StateExport.seq += 1
+        record.seq = StateExport.seq
+        StateExport.list_by_seq[record.seq] = record
+        StateExport.add_seq(record.seq)
+
+    def iter_seqs(since=0):
+        b = max(bisect_right(StateExport.block_firsts, since) - 1, 0)
+        i = bisect_right(StateExport.seq_blocks[b], since)
+        while b < len(StateExport.seq_blocks):
+            yield from StateExport.seq_blocks[b][i:]
+            b += 1
+            i = 0
+
+    def iter_records(since=0):
+        # export dicts, archived records are read back from the archive
+        for seq in StateExport.iter_seqs(since):
+            record = StateExport.list_by_seq.get(seq)
+            yield record.to_export_dict() if record is not None else Archive.read_export_dict(seq)
+
+    def iter_ndjson(since=0):
+        for export_dict in StateExport.iter_records(since):
+            yield json.dumps(export_dict, separators=(',',':')) + "\n"
+
+    def get_page(since=0,size=EXPORT_PAGE_SIZE):
+        return "".join(islice(StateExport.iter_ndjson(since), size))
+
+    def write_file(path,since=0):
+        lines = 0
+        with open(path, "w") as export_file:
+            for line in StateExport.iter_ndjson(since):
+                export_file.write(line)
+                lines += 1
+        return lines
+
+
+class Archive:
+    # Append-only region of zlib compressed json records (finished duels and withdrawn birds),
+    #   used when the DApp RSS exceeds DAPP_MEMORY_BUDGET. Only summary counters and a packed
+    #   record index (numpy arrays of region offsets, 16 bytes per entry) stay in memory:
+    #   by key hash (bird id, duel id or erc721 id) and by export seq
+    cold_birds = {} # id -> withdrawn bird not archived yet
+    cold_duels = [] # finished duels not archived yet
+    archived_species = {} # species -> number of archived birds
+    key_hashes = np.zeros(0, dtype=np.uint64) # sorted, with key_offsets in archive order for each key
+    key_offsets = np.zeros(0, dtype=np.uint64)
+    seqs = np.zeros(0, dtype=np.uint64) # sorted export seqs, with the offsets of their records
+    seq_offsets = np.zeros(0, dtype=np.uint64)
+    region = None # opened on the first compaction
+    size = 0
+    archived_birds = 0
+    archived_duels = 0
+    compactions = 0
+
+    def open_region():
+        # the index only lives in this process, so a previous archive file is overwritten
+        if Archive.region is None:
+            Archive.region = open(DAPP_ARCHIVE_FILE, "w+b") if DAPP_ARCHIVE_FILE else bytearray()
+
+    def key_hash(key):
+        return int.from_bytes(SHA224.new(data=str2binary(str(key))).digest()[:8], "little")
+
+    def write(record):
+        # each record is its length (4 bytes) and the compressed json
+        blob = zlib.compress(str2binary(json.dumps(record, separators=(',',':'))))
+        blob = len(blob).to_bytes(4, "little") + blob
+        if DAPP_ARCHIVE_FILE:
+            Archive.region.seek(Archive.size)
+            Archive.region.write(blob)
+            Archive.region.flush()
+        else:
+            Archive.region += blob
+        offset = Archive.size
+        Archive.size += len(blob)
+        return offset
+
+    def read_record(offset):
+        offset = int(offset)
+        if DAPP_ARCHIVE_FILE:
+            Archive.region.seek(offset)
+            length = int.from_bytes(Archive.region.read(4), "little")
+            blob = Archive.region.read(length)
+        else:
+            length = int.from_bytes(Archive.region[offset:offset+4], "little")
+            blob = bytes(Archive.region[offset+4:offset+4+length])
+        return json.loads(zlib.decompress(blob))
+
+    def add_to_index(keys,seqs):
+        # keys: list of (key, offset), seqs: list of (seq, offset), of the records just written
+        key_entries = np.array([(Archive.key_hash(k), o) for k,o in keys], dtype=np.uint64).reshape(-1, 2)
+        key_hashes = np.concatenate([Archive.key_hashes, key_entries[:,0]])
+        key_offsets = np.concatenate([Archive.key_offsets, key_entries[:,1]])
+        order = np.lexsort((key_offsets, key_hashes))
+        Archive.key_hashes, Archive.key_offsets = key_hashes[order], key_offsets[order]
+
+        seq_entries = np.array(seqs, dtype=np.uint64).reshape(-1, 2)
+        seqs = np.concatenate([Archive.seqs, seq_entries[:,0]])
+        seq_offsets = np.concatenate([Archive.seq_offsets, seq_entries[:,1]])
+        order = np.argsort(seqs, kind='stable')
+        Archive.seqs, Archive.seq_offsets = seqs[order], seq_offsets[order]
+
+    def read(key,field='id'):
+        # records of the key, in archive order (hash collisions are filtered out by the record field)
+        key_hash = np.uint64(Archive.key_hash(key))
+        first = np.searchsorted(Archive.key_hashes, key_hash, side='left')
+        last = np.searchsorted(Archive.key_hashes, key_hash, side='right')
+        records = [Archive.read_record(offset) for offset in Archive.key_offsets[first:last]]
+        return [r for r in records if r.get(field) == key]
+
+    def read_export_dict(seq):
+        export_dict = Archive.read_record(Archive.seq_offsets[np.searchsorted(Archive.seqs, np.uint64(seq))])
+        export_dict.pop('tournament_ids', None)
+        return export_dict
+
+    def get_archived_bird(bird_id):
+        # last record of a bird that is in the archive (and not back in memory)
+        if bird_id is None or bird_id in Bird.list_by_id:
+            return None
+        records = [r for r in Archive.read(bird_id) if r.get('type') == 'bird']
+        return records[-1] if len(records) > 0 else None
+
+    def get_bird_id_by_erc721_id(token_id):
+        records = Archive.read(token_id,'erc721_id')
+        return records[-1]['id'] if len(records) > 0 else None
+
+    def restore_bird(bird_id):
+        record = Archive.get_archived_bird(bird_id)
+        if record is None:
+            return None
+        # the bird is back in memory (as a withdrawn bird), the archive keeps its old records
+        Archive.archived_birds -= 1
+        Archive.archived_species[record['species']] -= 1
+        if Archive.archived_species[record['species']] == 0:
+            del Archive.archived_species[record['species']]
+        bird = Bird.restore(record)
+        # the next change of the bird replaces its archived export entry
+        bird.seq = record['seq']
+        Archive.cold_birds[bird.id] = bird
+        return bird
+
+    def register_erc721_id(bird_id,token_id):
+        record = Archive.get_archived_bird(bird_id)
+        if record is None:
+            return None
+        # a new record of the archived bird, with a new export seq
+        record['erc721_id'] = token_id
+        StateExport.remove_seq(record['seq'])
+        StateExport.seq += 1
+        record['seq'] = StateExport.seq
+        StateExport.add_seq(record['seq'])
+        offset = Archive.write(record)
+        Archive.add_to_index([(bird_id, offset), (token_id, offset)], [(record['seq'], offset)])
+        record.pop('tournament_ids')
+        return record
+
+    def get_rss():
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+
+    def check_memory_budget():
+        if DAPP_MEMORY_BUDGET > 0 and Archive.get_rss() > DAPP_MEMORY_BUDGET:
+            Archive.compact()
+
+    def compact():
+        if len(Archive.cold_duels) + len(Archive.cold_birds) < ARCHIVE_MIN_RECORDS:
+            return
+        logger.info("Archiving %s duels and %s birds (rss %s)", len(Archive.cold_duels), len(Archive.cold_birds), Archive.get_rss())
+        Archive.open_region()
+        keys = []
+        seqs = []
+
+        # finished duels become counters on birds and ornithologists
+        holders = {}
+        for duel in Archive.cold_duels:
+            for bird_id in (duel.bird1_id, duel.bird2_id):
+                bird = Bird.list_by_id.get(bird_id)
+                if bird is not None:
+                    holders[id(bird)] = (bird, bird.id, 'winner')
+            for ornithologist in (duel.ornithologist1, duel.ornithologist2):
+                ornithologist_object = Ornithologist.get_ornithologist(ornithologist)
+                holders[id(ornithologist_object)] = (ornithologist_object, ornithologist_object.address, 'winner_ornithologist')
+        for holder,holder_id,winner_attr in holders.values():
+            holder.archived_duels += len(holder.duels)
+            holder.archived_wins += len(list(filter(lambda d: getattr(d, winner_attr) == holder_id, holder.duels)))
+            holder.duels = []
+        for duel in Archive.cold_duels:
+            offset = Archive.write(duel.to_export_dict())
+            keys.append((duel.id, offset))
+            seqs.append((duel.seq, offset))
+            del StateExport.list_by_seq[duel.seq]
+            Archive.archived_duels += 1
+        Archive.cold_duels = []
+
+        # withdrawn birds leave memory (the export reads them from the archive),
+        #   except the ones chosen in open duels
+        dueling_birds = set(duel.bird2_id for duel in Duel.list_by_id.values())
+        remaining_birds = {}
+        for bird in Archive.cold_birds.values():
+            if bird.id in dueling_birds:
+                remaining_birds[bird.id] = bird
+                continue
+            offset = Archive.write(bird.to_archive_dict())
+            keys.append((bird.id, offset))
+            seqs.append((bird.seq, offset))
+            if bird.erc721_id is not None:
+                keys.append((bird.erc721_id, offset))
+                del Bird.list_by_erc721_id[bird.erc721_id]
+            del Bird.list_by_id[bird.id]
+            del StateExport.list_by_seq[bird.seq]
+            Archive.archived_birds += 1
+            Archive.archived_species[bird.species_name] = Archive.archived_species.get(bird.species_name, 0) + 1
+        Archive.cold_birds = remaining_birds
+
+        Archive.add_to_index(keys,seqs)
+        Archive.compactions += 1
+
+    def get_summary():
+        return str({'rss': Archive.get_rss(), 'memory_budget': DAPP_MEMORY_BUDGET, 'archive_size': Archive.size, \
+            'archived_birds': Archive.archived_birds, 'archived_duels': Archive.archived_duels, 'compactions': Archive.compactions, \
+            'index_size': Archive.key_hashes.nbytes + Archive.key_offsets.nbytes + Archive.seqs.nbytes + Archive.seq_offsets.nbytes})
+
+
 ###
 # Aux Functions 
 
@@ -357,7 +1043,24 @@ def hex2str(hexstr):
     return binary2str(hex2binary(hexstr))
 
 def binary2str(binary):
-    return binary.decode("utf-8")
+    return str(binary, "utf-8")
+
+def bird_commit_hash(chosen_bird,nonce):
+    bird_nonce = f"{chosen_bird}-{nonce}"
+    return SHA512.new(truncate="256", data=str2binary(bird_nonce)).hexdigest()
+
+class LazyLog:
+    # Defers str() of a log argument until the record is actually emitted,
+    #   truncating it to DAPP_LOG_MAX_PAYLOAD chars (with a digest of the full text)
+    def __init__(self,obj):
+        self.obj = obj
+
+    def __str__(self):
+        text = str(self.obj)
+        if DAPP_LOG_MAX_PAYLOAD and len(text) > DAPP_LOG_MAX_PAYLOAD:
+            digest = SHA224.new(data=str2binary(text)).hexdigest()[:10]
+            text = f"{text[:DAPP_LOG_MAX_PAYLOAD]}... [{len(text)} chars, sha224 {digest}]"
+        return text
 
 def send_voucher(voucher):
     send_post("voucher",voucher)
@@ -370,7 +1073,7 @@ def send_notice(notice):
 
 def send_post(endpoint,json_data):
     response = requests.post(rollup_server + f"/{endpoint}", json=json_data)
-    logger.info(f"/{endpoint}: Received response status {response.status_code} body {response.content}")
+    logger.info("/%s: Received response status %s body %s", endpoint, response.status_code, LazyLog(response.content))
 
 
 ###
@@ -411,6 +1114,10 @@ ETHER_WITHDRAWAL_FUNCTION_SELECTOR = b't\x95k\x94'
 #   which corresponds to the first 4 bytes of the Keccak256-encoded result of "mint(address,string)"
 ERC721_MINTTOADDRESS_FUNCTION_SELECTOR = b'\xd0\xde\xf5!'
 
+# Bird contract function selector to be called during the execution of a voucher,
+#   which corresponds to the first 4 bytes of the Keccak256-encoded result of "mintBatch(address,string[])"
+BIRD_MINTBATCH_FUNCTION_SELECTOR = b'\xed\x0e1\xde'
+
 # Set Dapp Address contract function selector called during setup to set the dapp address,
 #   which corresponds to the first 4 bytes of the Keccak256-encoded result of "sendBirdAddress()"
 BIRD_SENDBIRDADDRESS_FUNCTION_SELECTOR = b'\xe8A\xebW'
@@ -419,52 +1126,123 @@ BIRD_SENDBIRDADDRESS_FUNCTION_SELECTOR = b'\xe8A\xebW'
 ###
 # Create Voucher Aux Functions 
 
+# eth_abi is the slowest module to import, and it is only needed to encode vouchers
+#   and for the fallback deposit decoding, so it is imported on first use
+def abi_encode(types,values):
+    from eth_abi import encode
+    return encode(types,values)
+
+def abi_decode(types,binary):
+    from eth_abi import decode
+    return decode(types,binary)
+
 def create_erc20_transfer_voucher(token_address,receiver,amount):
     # Function to be called in voucher [token_address].transfer([address receiver],[uint256 amount])
-    data = encode(['address', 'uint256'], [receiver,amount])
+    data = abi_encode(['address', 'uint256'], [receiver,amount])
     voucher_payload = binary2hex(ERC20_TRANSFER_FUNCTION_SELECTOR + data)
     voucher = {"address": token_address, "payload": voucher_payload}
     return voucher
 
 def create_erc721_safetransfer_voucher(token_address,sender,receiver,token_id):
     # Function to be called in voucher [token_address].transfer([address sender],[address receiver],[uint256 id])
-    data = encode(['address', 'address', 'uint256'], [sender,receiver,token_id])
+    data = abi_encode(['address', 'address', 'uint256'], [sender,receiver,token_id])
     voucher_payload = binary2hex(ERC721_SAFETRANSFER_FUNCTION_SELECTOR + data)
     voucher = {"address": token_address, "payload": voucher_payload}
     return voucher
 
 def create_ether_withdrawal_voucher(receiver,amount):
     # Function to be called in voucher [rollups_address].etherWithdrawal(bytes) where bytes is ([address receiver],[uint256 amount])
-    data = encode(['address', 'uint256'], [receiver,amount])
-    data2 = encode(['bytes'],[data])
+    data = abi_encode(['address', 'uint256'], [receiver,amount])
+    data2 = abi_encode(['bytes'],[data])
     voucher_payload = binary2hex(ETHER_WITHDRAWAL_FUNCTION_SELECTOR + data2)
     voucher = {"address": rollup_address, "payload": voucher_payload}
     return voucher
 
 def create_erc721_mint_voucher(token_address,receiver,string_data):
     # Function to be called in voucher [token_address].mint([address receiver],[string string_data])
-    data = encode(['address', 'string'], [receiver,string_data])
+    data = abi_encode(['address', 'string'], [receiver,string_data])
     voucher_payload = binary2hex(ERC721_MINTTOADDRESS_FUNCTION_SELECTOR + data)
     voucher = {"address": token_address, "payload": voucher_payload}
     return voucher
 
+def create_erc721_mint_batch_voucher(token_address,receiver,string_data_list):
+    # Function to be called in voucher [token_address].mintBatch([address receiver],[string[] string_data_list])
+    data = abi_encode(['address', 'string[]'], [receiver,string_data_list])
+    voucher_payload = binary2hex(BIRD_MINTBATCH_FUNCTION_SELECTOR + data)
+    voucher = {"address": token_address, "payload": voucher_payload}
+    return voucher
+
+
+###
+# Fast ABI Decoding Aux Functions
+#   Portal deposits have a fixed head of 32 bytes words and at most one dynamic
+#   'bytes' tail, so values are read directly at their offsets from a memoryview.
+#   Anything eth_abi would validate differently (non zero address padding,
+#   out of bounds tail, non zero tail padding) falls back to eth_abi decode.
+
+ABI_ADDRESS_PADDING = bytes(12)
+
+def abi_read_bytes32(binary,head):
+    return bytes(binary[head:head+32])
+
+def abi_read_address(binary,head):
+    if binary[head:head+12] != ABI_ADDRESS_PADDING:
+        return None
+    return "0x" + binary[head+12:head+32].hex()
+
+def abi_read_uint256(binary,head):
+    return int.from_bytes(binary[head:head+32], "big")
+
+def abi_read_bytes(binary,head):
+    start = abi_read_uint256(binary,head) + 32
+    if start > len(binary):
+        return None
+    length = abi_read_uint256(binary,start-32)
+    end = start + length
+    padded_end = start + 32 * -(-length // 32)
+    if padded_end > len(binary) or any(binary[end:padded_end]):
+        return None
+    return bytes(binary[start:end])
+
+abi_readers = {
+    'bytes32': abi_read_bytes32,
+    'address': abi_read_address,
+    'uint256': abi_read_uint256,
+    'bytes': abi_read_bytes,
+}
+
+def compile_abi_decoder(types):
+    readers = tuple((abi_readers[t], 32*i) for i,t in enumerate(types))
+    head_size = 32*len(types)
+    def abi_decoder(binary):
+        if len(binary) >= head_size:
+            decoded = tuple(read(binary,head) for read,head in readers)
+            if not any(v is None for v in decoded):
+                return decoded
+        return abi_decode(types, bytes(binary))
+    return abi_decoder
+
+erc20_deposit_decoder = compile_abi_decoder(['bytes32', 'address', 'address', 'uint256', 'bytes'])
+erc721_deposit_decoder = compile_abi_decoder(['bytes32', 'address', 'address', 'address', 'uint256', 'bytes'])
+ether_deposit_decoder = compile_abi_decoder(['bytes32', 'address', 'uint256', 'bytes'])
+
 
 ###
 # Decode Inputs Aux Functions 
 
 def decode_erc20_deposit(binary):
-    decoded = decode(['bytes32', 'address', 'address', 'uint256', 'bytes'], binary)
+    decoded = erc20_deposit_decoder(binary)
     erc20_deposit = {
         "depositor":decoded[1],
         "token_address":decoded[2],
         "amount":decoded[3],
         "data":decoded[4],
     }
-    logger.info(erc20_deposit)
+    logger.info("%s", LazyLog(erc20_deposit))
     return erc20_deposit
 
 def decode_erc721_deposit(binary):
-    decoded = decode(['bytes32', 'address', 'address', 'address', 'uint256', 'bytes'], binary)
+    decoded = erc721_deposit_decoder(binary)
     erc721_deposit = {
         "token_address":decoded[1],
         "operator":decoded[2],
@@ -472,23 +1250,24 @@ def decode_erc721_deposit(binary):
         "token_id":decoded[4],
         "data":decoded[5],
     }
-    logger.info(erc721_deposit)
+    logger.info("%s", LazyLog(erc721_deposit))
     return erc721_deposit
 
 def decode_ether_deposit(binary):
-    decoded = decode(['bytes32', 'address', 'uint256', 'bytes'], binary)
+    decoded = ether_deposit_decoder(binary)
     ether_deposit = {
         "depositor":decoded[1],
         "amount":decoded[2],
         "data":decoded[3],
     }
-    logger.info(ether_deposit)
+    logger.info("%s", LazyLog(ether_deposit))
     return ether_deposit
 
-def decode_birdwatch_input(payload):
+def decode_birdwatch_summary(payload):
     str_payload = binary2str(payload)
-    summary = json.loads(str_payload)
+    return json.loads(str_payload)
 
+def decode_birdwatch_input(summary):
     # transform coordinates to the used on geo file
     y,x = transformer.transform(summary['y'],summary['x']) # coordinates
     y2,x2 = transformer.transform(summary['y'],summary['x']+summary['r'])
@@ -509,16 +1288,16 @@ def decode_birdwatch_input(payload):
 #  Process Input Functions 
 
 # input from birdwatch contract
-def process_bird_contract_input(payload):
-    binary = hex2binary(payload)
-    action_index = int.from_bytes(binary[0:1], "little")
-    logger.info(f"action_index {action_index}")
+def process_bird_contract_input(timestamp,payload):
+    binary = memoryview(hex2binary(payload))
+    action_index = binary[0]
+    logger.info("action_index %s", action_index)
     
     returned_bird = None
 
     if action_index == BirdContractAction.BIRDWATCH.value:
         birdwatch_payload = binary[1:]
-        returned_bird = process_birdwatch(birdwatch_payload)
+        returned_bird = process_birdwatch(timestamp,birdwatch_payload)
 
     elif action_index == BirdContractAction.REGISTER_ERC721_ID.value:
         token_id = int.from_bytes(binary[1:33], "big")
@@ -529,13 +1308,24 @@ def process_bird_contract_input(payload):
         raise Exception(f"Invalid action index {action_index}")
 
     if returned_bird:
-        logger.info(f"Send notice {returned_bird}")
-        send_notice({"payload": str2hex(str(returned_bird))})
+        notice = str(returned_bird)
+        logger.info("Send notice %s", LazyLog(notice))
+        send_notice({"payload": str2hex(notice)})
+
+
+def process_birdwatch(timestamp,payload):
+    summary = decode_birdwatch_summary(payload)
+
+    # reject replayed claims before any geo work
+    claim_digest = ClaimIndex.get_digest(summary)
+    if ClaimIndex.is_duplicated(claim_digest,timestamp):
+        raise Exception("Birdwatch claim already processed")
 
+    # waits for the warm-up thread, or loads the geo data on the first birdwatch
+    load_geo()
 
-def process_birdwatch(payload):
-    birdwatch_input = decode_birdwatch_input(payload)
-    logger.info(f"Processing birdwatch input {birdwatch_input}")
+    birdwatch_input = decode_birdwatch_input(summary)
+    logger.info("Processing birdwatch input %s", LazyLog(birdwatch_input))
 
     # Simple probability of encountering a bird
     #   The centroid and radius define a region of birds that live in the area
@@ -547,18 +1337,23 @@ def process_birdwatch(payload):
     walk_region = Point(birdwatch_input['longitude'],birdwatch_input['latitude']).buffer(birdwatch_input['radius'])
 
     # Birds that could have been crossed according to their regiosn
-    crossed_by_birds = shapes_tree.query(walk_region)
-    birds_codes_in_area = []
-    for bird_type in crossed_by_birds:
-        b = birds_geo.__getitem__(shapes_tree.nearest_item(bird_type))
-        birds_codes_in_area.append(b['properties']['speciescodeEU'])
-    
-    birds_codes_in_area = list(set(birds_codes_in_area))
+    crossed_by_birds = shapes_tree.query_items(walk_region)
+    birds_in_area = np.bitwise_or.reduce(shapes_species_bitsets[crossed_by_birds], axis=0) \
+        if len(crossed_by_birds) > 0 else EMPTY_SPECIES_BITSET
 
     # df of possible birds crossed
-    possible_birds = birds_df[birds_df['speciescode'].isin(birds_codes_in_area)]
+    possible_rows = bitset_species(birds_in_area)
+    possible_birds = birds_df.iloc[possible_rows]
+    weights = possible_birds['density'].values
+
+    if DAPP_ENCOUNTER_MODEL == "area":
+        # expected birds in the walk: density times the area of the species region inside the walk
+        area_weights = weights * species_area_in_disk(birdwatch_input['longitude'],birdwatch_input['latitude'],birdwatch_input['radius'])[possible_rows]
+        if area_weights.sum() > 0:
+            possible_birds = possible_birds[area_weights > 0]
+            weights = area_weights[area_weights > 0]
 
-    total_density = sum(possible_birds['density'])
+    total_weight = sum(weights)
 
     # each 2 min a new encounter
     n_encounters = int(birdwatch_input['timespan'] / ENCOUNTER_INTERVAL)
@@ -568,7 +1363,7 @@ def process_birdwatch(payload):
 
     # probabiliy of each bird encounter
     n_possible = len(possible_birds['density'])
-    probabilities = possible_birds['density']/total_density
+    probabilities = weights/total_weight
 
     # get bird specie per encounter
     rnd_generator = Generator(PCG64(random_seed))
@@ -582,13 +1377,15 @@ def process_birdwatch(payload):
     least_common_bird = chosen_birds[chosen_birds['density'].min() == chosen_birds['density']]
 
     # create new bird
-    return Bird(birdwatch_input['account'],least_common_bird['key_0'].iloc[0])
+    bird = Bird(birdwatch_input['account'],least_common_bird['key_0'].iloc[0])
+    ClaimIndex.add(claim_digest,timestamp)
+    return bird
 
 # input from admin
 def process_admin(sender,payload):
     binary = hex2binary(payload)
     action_index = int.from_bytes(binary[0:1], "little")
-    logger.info(f"action_index {action_index}")
+    logger.info("action_index %s", action_index)
     
     function_signature = binary[1:]
 
@@ -598,7 +1395,7 @@ def process_admin(sender,payload):
     global bird_contract_address
     bird_contract_address = sender
     msg = f"The configured bird contract address is {bird_contract_address}"
-    logger.info(f"Send notice {msg}")
+    logger.info("Send notice %s", msg)
     send_notice({"payload": str2hex(str(msg))})
     return True
 
@@ -610,14 +1407,21 @@ def process_input(metadata,json_input):
         msg_return = process_withdraw(metadata['msg_sender'],json_input)
     elif action == 'duel':
         msg_return = process_duel(metadata['msg_sender'],metadata['timestamp'],json_input)
+    elif action == 'tournament':
+        msg_return = process_tournament(metadata['msg_sender'],metadata['timestamp'],json_input)
     else:
         raise Exception(f"Unrecognized 'action' {action}")
         
     if msg_return:
-        logger.info(f"Send notice {msg_return}")
-        send_notice({"payload": str2hex(str(msg_return))})
+        notice = str(msg_return)
+        logger.info("Send notice %s", LazyLog(notice))
+        send_notice({"payload": str2hex(notice)})
 
 def process_withdraw(sender,json_input):
+    bird_ids = json_input.get('birds')
+    if bird_ids is not None:
+        return process_withdraw_batch(sender,bird_ids)
+
     bird_id = json_input.get('bird')
     if not bird_id:
         raise Exception("'bird' id not informed")
@@ -630,6 +1434,24 @@ def process_withdraw(sender,json_input):
     
     bird.withdraw()
 
+def process_withdraw_batch(sender,bird_ids):
+    if type(bird_ids) != type([]) or len(bird_ids) == 0:
+        raise Exception("'birds' must be a non empty list of bird ids")
+    if len(set(bird_ids)) != len(bird_ids):
+        raise Exception("Repeated bird ids")
+
+    # validate all birds before generating any voucher
+    birds = []
+    for bird_id in bird_ids:
+        bird = Bird.list_by_id.get(bird_id)
+        if not bird:
+            raise Exception(f"Bird {bird_id} not found")
+        if bird.ornithologist != sender:
+            raise Exception(f"Bird {bird_id} current ornithologist is not sender")
+        birds.append(bird)
+
+    Bird.withdraw_batch(sender,birds)
+
 def process_duel(sender,timestamp,json_input):
     opponent = json_input.get('opponent')
     if not opponent:
@@ -688,11 +1510,46 @@ def process_duel(sender,timestamp,json_input):
 
     return duel
 
+def process_tournament(sender,timestamp,json_input):
+    tournament_id = json_input.get('tournament')
+
+    if not tournament_id:
+        # create new tournament
+        trait = json_input.get('trait')
+        if not trait:
+            raise Exception("Trait to compare not informed")
+        compare_greater = json_input.get('compare_greater')
+        compare_greater = True if compare_greater is None else \
+            bool(json.loads(compare_greater) if type(compare_greater) == type('') else compare_greater)
+        entry_timeout = int(json_input.get('entry_timeout',TOURNAMENT_TIMEOUT))
+        reveal_timeout = int(json_input.get('reveal_timeout',TOURNAMENT_TIMEOUT))
+        return Tournament(timestamp,sender,trait,compare_greater,entry_timeout,reveal_timeout)
+
+    tournament = Tournament.list_by_id.get(tournament_id)
+    if not tournament:
+        raise Exception("Tournament not found")
+
+    resolve = json_input.get('resolve')
+    if (not (resolve is None)) and bool(json.loads(resolve) if type(resolve) == type('') else resolve):
+        tournament.resolve(timestamp)
+    elif json_input.get('commit'):
+        tournament.add_entry(timestamp,sender,json_input.get('commit'))
+    else:
+        bird = json_input.get('bird')
+        nonce = json_input.get('nonce')
+        if bird is None:
+            raise Exception("You must provide the 'bird' id")
+        if nonce is None:
+            raise Exception("You must provide the 'nonce' used in commit")
+        tournament.add_reveal(timestamp,sender,bird,nonce)
+
+    return tournament
+
 # input from portals
 def process_deposit_and_generate_voucher(payload):
-    binary = hex2binary(payload)
-    input_header = decode(['bytes32'], binary)[0]
-    logger.info(f"header {input_header}")
+    binary = memoryview(hex2binary(payload))
+    input_header = abi_read_bytes32(binary,0)
+    logger.info("header %s", input_header)
     voucher = None
 
     if input_header == ERC20_DEPOSIT_HEADER:
@@ -739,7 +1596,7 @@ def process_deposit_and_generate_voucher(payload):
         pass
 
     if voucher:
-        logger.info(f"voucher {voucher}")
+        logger.info("voucher %s", LazyLog(voucher))
         send_voucher(voucher)
 
 
@@ -748,7 +1605,7 @@ def process_deposit_and_generate_voucher(payload):
 # handlers
 
 def handle_advance(data):
-    logger.info(f"Received advance request data {data}")
+    logger.info("Received advance request data %s", LazyLog(data))
 
     try:
         # TODO: use better randomness technique
@@ -760,23 +1617,24 @@ def handle_advance(data):
         # Check whether an input was sent by the Portal,
         #   which is where all deposits must come from
         if data["metadata"]["msg_sender"] == rollup_address:
-            logger.info(f"Processing portal input")
+            logger.info("Processing portal input")
             process_deposit_and_generate_voucher(payload)
         elif data["metadata"]["msg_sender"] == bird_contract_address:
-            logger.info(f"Processing bird address input")
+            logger.info("Processing bird address input")
             # Check whether an input was sent by the bird contract,
-            process_bird_contract_input(payload)
+            process_bird_contract_input(data["metadata"]["timestamp"],payload)
         elif bird_contract_address is None:
             # Try to set bird contract address 
-            logger.info(f"Processing admin bird address input")
+            logger.info("Processing admin bird address input")
             process_admin(data["metadata"]["msg_sender"],payload)
         else:
             # Otherwise, payload should be a json with the action choice
             str_payload = hex2str(payload)
-            logger.info(f"Received {str_payload}")
+            logger.info("Received %s", LazyLog(str_payload))
             json_input = json.loads(str_payload)
             process_input(data["metadata"],json_input)
-        
+
+        Archive.check_memory_budget()
         return "accept"
 
     except Exception as e:
@@ -786,27 +1644,61 @@ def handle_advance(data):
         return "reject"
 
 def handle_inspect(data):
-    logger.info(f"Received inspect request data {data}")
+    logger.info("Received inspect request data %s", LazyLog(data))
 
     try:
         payload = data["payload"]
 
         inspected_payload = hex2str(payload).lower()
-        logger.info(f"Inspect payload {inspected_payload}")
+        logger.info("Inspect payload %s", LazyLog(inspected_payload))
+
+        response = None
+        if inspected_payload.startswith("export/"):
+            # export/<since seq>[/<size>]
+            export_args = inspected_payload.split("/")
+            since = int(export_args[1]) if len(export_args) > 1 and export_args[1] else 0
+            if DAPP_EXPORT_FILE:
+                lines = StateExport.write_file(DAPP_EXPORT_FILE,since)
+                response = f"Exported {lines} records to {DAPP_EXPORT_FILE}, last seq {StateExport.seq}"
+            else:
+                size = int(export_args[2]) if len(export_args) > 2 else EXPORT_PAGE_SIZE
+                response = StateExport.get_page(since,size)
+                # an empty page means there are no records after 'since'
+                if not response:
+                    response = f"No records after seq {since}, last seq {StateExport.seq}"
+
+        elif inspected_payload == "archive":
+            response = Archive.get_summary()
+
+        elif inspected_payload.startswith("archive/"):
+            # archive/<bird or duel id>
+            archived = Archive.read(inspected_payload[len("archive/"):])
+            response = str(archived) if len(archived) > 0 else "No archived records"
+
+        elif inspected_payload.startswith("leaderboard/"):
+            # leaderboard/<trait>[/<size>]
+            leaderboard_args = inspected_payload.split("/")
+            size = int(leaderboard_args[2]) if len(leaderboard_args) > 2 else LEADERBOARD_SIZE
+            response = Leaderboard.get_leaderboard(leaderboard_args[1],size)
 
-        response = Bird.list_by_id.get(inspected_payload)
+        if not response:
+            response = Bird.list_by_id.get(inspected_payload)
 
         if not response:
             response = Duel.list_by_id.get(inspected_payload)
 
+        if not response:
+            response = Tournament.list_by_id.get(inspected_payload)
+
         if not response:
             response = Ornithologist.list_by_id.get(inspected_payload)
 
         if not response:
             response = Bird.get_encountered_summary()
 
-        logger.info(f"report {response}")
-        report_payload = str2hex(str(response))
+        report = str(response)
+        logger.info("report %s", LazyLog(report))
+        report_payload = str2hex(report)
 
         send_report({"payload": report_payload})
 
@@ -831,21 +1723,23 @@ handlers = {
 finish = {"status": "accept"}
 rollup_address = None
 
-while True:
-    logger.info("Sending finish")
-    response = requests.post(rollup_server + "/finish", json=finish)
-    logger.info(f"Received finish status {response.status_code}")
-    if response.status_code == 202:
-        logger.info("No pending rollup request, trying again")
-    else:
-        rollup_request = response.json()
-        data = rollup_request["data"]
-        if "metadata" in data:
-            metadata = data["metadata"]
-            if metadata["epoch_index"] == 0 and metadata["input_index"] == 0:
-                rollup_address = metadata["msg_sender"]
-                logger.info(f"Captured rollup address: {rollup_address}")
-                continue
-        handler = handlers[rollup_request["request_type"]]
-        finish["status"] = handler(rollup_request["data"])
+if __name__ == "__main__":
+    logger.info("Ready to handle requests after %.2fs (geo data %s)", time.monotonic() - init_start, "loaded" if geo_loaded else DAPP_GEO_INIT)
 
+    while True:
+        logger.info("Sending finish")
+        response = requests.post(rollup_server + "/finish", json=finish)
+        logger.info("Received finish status %s", response.status_code)
+        if response.status_code == 202:
+            logger.info("No pending rollup request, trying again")
+        else:
+            rollup_request = response.json()
+            data = rollup_request["data"]
+            if "metadata" in data:
+                metadata = data["metadata"]
+                if metadata["epoch_index"] == 0 and metadata["input_index"] == 0:
+                    rollup_address = metadata["msg_sender"]
+                    logger.info("Captured rollup address: %s", rollup_address)
+                    continue
+            handler = handlers[rollup_request["request_type"]]
+            finish["status"] = handler(rollup_request["data"])
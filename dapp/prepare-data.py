@@ -63,6 +63,58 @@ birds_traits_df['speciesname_join'] = birds_traits_df.apply(
 birds_join_df = pd.merge(left=birds_pop_df,right=birds_traits_df,left_on=birds_pop_df['speciesname_join'],right_on=birds_traits_df['speciesname_join'],how='inner')
 birds_join_df = birds_join_df.drop(columns=list(filter(lambda c: "speciesname_join" in c, birds_join_df.columns)))
 
+# dense rank of each duel trait (same as Duel.accepted_traits on the DApp),
+#   so duels and leaderboards compare integers instead of the raw measures.
+#   Missing measures get rank -1 (MISSING_TRAIT_RANK on the DApp), which is never compared
+duel_traits = ['complete.measures', 'beak.length_culmen', 'beak.length_nares', 'beak.width', 
+    'beak.depth', 'tarsus.length',  'wing.length', 'kipps.distance', 'secondary1', 'hand-wing.index', 
+    'tail.length', 'mass']
+for trait in duel_traits:
+    birds_join_df[f"{trait}.rank"] = birds_join_df[trait].rank(method='dense').fillna(-1).astype(int)
+
 # write to file
 birds_join_df.to_csv(DAPP_BIRDS_FILE)
 
+# Per tile coverage fraction of each species distribution (on the geo file grid, EPSG:3035),
+#   only needed by the DApp area weighted encounter model (DAPP_ENCOUNTER_MODEL=area)
+DAPP_ENCOUNTER_MODEL = environ.get('DAPP_ENCOUNTER_MODEL', 'density').lower()
+DAPP_BIRDS_GEO_FILE = environ.get('DAPP_BIRDS_GEO_FILE')
+DAPP_BIRDS_TILES_FILE = environ.get('DAPP_BIRDS_TILES_FILE')
+TILE_SIZE = float(environ.get('DAPP_TILE_SIZE', '10000')) # meters
+
+if DAPP_ENCOUNTER_MODEL == 'area' and DAPP_BIRDS_GEO_FILE and DAPP_BIRDS_TILES_FILE:
+    import fiona
+    from shapely.geometry import shape, box
+    from shapely.prepared import prep
+
+    # geo species code -> rows of the dapp birds file
+    species_rows = birds_join_df.reset_index(drop=True).groupby('speciescode').indices
+    tile_area = TILE_SIZE * TILE_SIZE
+
+    coverage = {} # (tile x, tile y, row) -> fraction
+    with fiona.open(DAPP_BIRDS_GEO_FILE) as birds_geo:
+        for f in birds_geo:
+            rows = species_rows.get(f['properties']['speciescodeEU'])
+            if rows is None:
+                continue
+            geometry = shape(f['geometry'])
+            for polygon in getattr(geometry, 'geoms', [geometry]):
+                prepared_polygon = prep(polygon)
+                minx, miny, maxx, maxy = polygon.bounds
+                for tx in range(int(np.floor(minx / TILE_SIZE)), int(np.floor(maxx / TILE_SIZE)) + 1):
+                    for ty in range(int(np.floor(miny / TILE_SIZE)), int(np.floor(maxy / TILE_SIZE)) + 1):
+                        tile = box(tx * TILE_SIZE, ty * TILE_SIZE, (tx + 1) * TILE_SIZE, (ty + 1) * TILE_SIZE)
+                        if prepared_polygon.contains(tile):
+                            fraction = 1.0
+                        elif prepared_polygon.intersects(tile):
+                            fraction = polygon.intersection(tile).area / tile_area
+                        else:
+                            continue
+                        for row in rows:
+                            coverage[(tx, ty, row)] = min(1.0, coverage.get((tx, ty, row), 0.0) + fraction)
+
+    tiles = np.array(list(coverage.keys()), dtype=np.int64).reshape(-1, 3)
+    with open(DAPP_BIRDS_TILES_FILE, 'wb') as tiles_file:
+        np.savez_compressed(tiles_file, tile_size=TILE_SIZE, tile_x=tiles[:, 0], tile_y=tiles[:, 1],
+            species=tiles[:, 2], fraction=np.array(list(coverage.values()), dtype=np.float32))
+
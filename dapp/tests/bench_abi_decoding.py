@@ -0,0 +1,30 @@
+# Deposit decodes per second: eth_abi.decode (header + full payload, as before) vs the fast decoders
+#   python tests/bench_abi_decoding.py
+
+import timeit
+
+from eth_abi import decode, encode
+
+from harness import load_ornithologist
+
+ROUNDS = 20000
+
+ornithologist = load_ornithologist()
+types = ['bytes32', 'address', 'address', 'address', 'uint256', 'bytes']
+payload = ornithologist.binary2hex(encode(types, [ornithologist.ERC721_DEPOSIT_HEADER, "0x" + "11" * 20,
+    "0x" + "22" * 20, "0x" + "33" * 20, 7, b"data"]))
+
+def eth_abi_decode():
+    binary = ornithologist.hex2binary(payload)
+    decode(['bytes32'], binary)
+    return decode(types, binary)
+
+def fast_decode():
+    binary = memoryview(ornithologist.hex2binary(payload))
+    ornithologist.abi_read_bytes32(binary, 0)
+    return ornithologist.erc721_deposit_decoder(binary)
+
+assert eth_abi_decode() == fast_decode()
+for name,fn in (("eth_abi", eth_abi_decode), ("fast", fast_decode)):
+    seconds = timeit.timeit(fn, number=ROUNDS)
+    print(f"{name:8} {ROUNDS / seconds:10.0f} decodes/s")
@@ -0,0 +1,31 @@
+# Cost of rejecting a replayed birdwatch claim vs processing a new one, through handle_advance.
+#   The geo data is stubbed (harness.stub_geo), so the full processing time leaves out the
+#   Shapely/pyproj work of the real geo file: the real ratio is larger
+#   python tests/bench_claim_index.py
+
+import time
+
+from shapely.geometry import Point
+
+from harness import load_ornithologist, stub_geo, birdwatch
+
+ROUNDS = 2000
+
+ornithologist = load_ornithologist(DAPP_LOG_LEVEL="CRITICAL")
+codes = ornithologist.birds_df['speciescode'].unique().tolist()
+stub_geo(ornithologist,[Point(i * 10, 0).buffer(50) for i in range(len(codes))],codes)
+summaries = [{"x": i % 250, "y": 0, "r": 20, "d": 1000, "t": 3600, "a": f"0x{i:040x}"} for i in range(ROUNDS)]
+
+start = time.perf_counter()
+for i,summary in enumerate(summaries):
+    assert birdwatch(ornithologist,1000 + i,summary) == "accept"
+processed = (time.perf_counter() - start) / ROUNDS
+
+start = time.perf_counter()
+for i,summary in enumerate(summaries):
+    assert birdwatch(ornithologist,1000 + ROUNDS + i,summary) == "reject"
+rejected = (time.perf_counter() - start) / ROUNDS
+
+print(f"new claim (full processing) {processed * 1e6:8.0f} us/input")
+print(f"replayed claim (rejected)   {rejected * 1e6:8.0f} us/input")
+print(f"claim index entries {len(ornithologist.ClaimIndex.list_by_digest)}")
@@ -0,0 +1,64 @@
+# Area of each species distribution inside birdwatch disks: the DApp tile model vs the exact
+#   shapely intersection (the per species reference), on random polygon distributions
+#   python tests/bench_encounter_area.py
+
+import time
+
+import numpy as np
+from shapely.geometry import Point, Polygon, box
+from shapely.prepared import prep
+
+from harness import load_ornithologist
+
+TILE_SIZE = 10000.0
+REGION = 500000.0
+RADIUS = 30000.0
+N_DISKS = 200
+
+ornithologist = load_ornithologist(DAPP_ENCOUNTER_MODEL="area")
+n_species = len(ornithologist.birds_df)
+rng = np.random.default_rng(0)
+
+def random_polygon():
+    cx, cy = rng.uniform(0, REGION, 2)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, 12))
+    radii = rng.uniform(20000, 150000, 12)
+    return Polygon(zip(cx + radii * np.cos(angles), cy + radii * np.sin(angles))).buffer(0)
+
+# same rasterization as prepare-data.py
+polygons = [random_polygon() for _ in range(n_species)]
+coverage = {}
+for row,polygon in enumerate(polygons):
+    prepared_polygon = prep(polygon)
+    minx, miny, maxx, maxy = polygon.bounds
+    for tx in range(int(np.floor(minx / TILE_SIZE)), int(np.floor(maxx / TILE_SIZE)) + 1):
+        for ty in range(int(np.floor(miny / TILE_SIZE)), int(np.floor(maxy / TILE_SIZE)) + 1):
+            tile = box(tx * TILE_SIZE, ty * TILE_SIZE, (tx + 1) * TILE_SIZE, (ty + 1) * TILE_SIZE)
+            if prepared_polygon.contains(tile):
+                fraction = 1.0
+            elif prepared_polygon.intersects(tile):
+                fraction = polygon.intersection(tile).area / (TILE_SIZE * TILE_SIZE)
+            else:
+                continue
+            coverage.setdefault((tx, ty), ([], []))
+            coverage[(tx, ty)][0].append(row)
+            coverage[(tx, ty)][1].append(fraction)
+ornithologist.tile_size = TILE_SIZE
+ornithologist.species_tiles = {k: (np.array(v[0]), np.array(v[1], dtype=np.float32)) for k,v in coverage.items()}
+
+disks = rng.uniform(RADIUS, REGION - RADIUS, (N_DISKS, 2))
+
+start = time.perf_counter()
+shapely_areas = np.array([[polygon.intersection(Point(x, y).buffer(RADIUS, 64)).area for polygon in polygons] for x,y in disks])
+shapely_time = (time.perf_counter() - start) / N_DISKS
+
+start = time.perf_counter()
+tile_areas = np.array([ornithologist.species_area_in_disk(x, y, RADIUS) for x,y in disks])
+tile_time = (time.perf_counter() - start) / N_DISKS
+
+disk_area = np.pi * RADIUS * RADIUS
+error = np.abs(tile_areas - shapely_areas) / disk_area
+print(f"{n_species} species, {N_DISKS} disks of {RADIUS / 1000:.0f} km, {TILE_SIZE / 1000:.0f} km tiles")
+print(f"shapely {shapely_time * 1e6:10.0f} us/birdwatch")
+print(f"tiles   {tile_time * 1e6:10.0f} us/birdwatch")
+print(f"area error (fraction of the disk): mean {error.mean():.3f}, max {error.max():.3f}")
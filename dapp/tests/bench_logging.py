@@ -0,0 +1,56 @@
+# Advance and inspect throughput at each log level and format, through handle_advance and
+#   handle_inspect. The inspect reports are larger than DAPP_LOG_MAX_PAYLOAD, so at INFO
+#   they are truncated with a SHA224 digest (the "no truncation" run shows that cost).
+#   Each configuration runs in its own process (logging is configured at import), logging to /dev/null
+#   python tests/bench_logging.py
+
+import os
+import sys
+import time
+import subprocess
+
+ROUNDS = 500
+CONFIGURATIONS = [
+    ("WARNING", "text", "512"),
+    ("INFO", "text", "512"),
+    ("INFO", "text", "0"),
+    ("INFO", "json", "512"),
+]
+
+def run(level,log_format,max_payload):
+    from harness import load_ornithologist, advance
+
+    ornithologist = load_ornithologist(DAPP_LOG_LEVEL=level, DAPP_LOG_FORMAT=log_format, DAPP_LOG_MAX_PAYLOAD=max_payload)
+    user1,user2 = "0x" + "01" * 20,"0x" + "02" * 20
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    for i in range(50):
+        ornithologist.Bird(user1,species_names[i % len(species_names)])
+        ornithologist.Bird(user2,species_names[(i + 1) % len(species_names)])
+    bird1 = next(iter(ornithologist.Ornithologist.list_by_id[user1].bird_catalogue))
+    bird2 = next(iter(ornithologist.Ornithologist.list_by_id[user2].bird_catalogue))
+    commit = ornithologist.bird_commit_hash(bird1,"nonce")
+    inspects = [{"payload": ornithologist.str2hex(payload)} for payload in (bird1, "")]
+
+    advances = 0
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        advance(ornithologist,user1,i,{"action": "duel", "opponent": user2, "trait": "mass", "commit": commit})
+        advance(ornithologist,user2,i,{"action": "duel", "opponent": user1, "bird": bird2})
+        advance(ornithologist,user1,i,{"action": "duel", "opponent": user2, "bird": bird1, "nonce": "nonce"})
+        advances += 3
+    advance_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        for data in inspects:
+            ornithologist.handle_inspect(data)
+    inspect_time = time.perf_counter() - start
+    print(f"{level:8} {log_format:5} max payload {max_payload:4}: {advances / advance_time:8.0f} advances/s {2 * ROUNDS / inspect_time:8.0f} inspects/s")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        run(*sys.argv[1:])
+    else:
+        for configuration in CONFIGURATIONS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), *configuration], stderr=subprocess.DEVNULL, check=True)
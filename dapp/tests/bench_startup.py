@@ -0,0 +1,84 @@
+# Time from starting the back-end process to its first handled request (an inspect answered
+#   with a report), against a local fake rollup server, for each DAPP_GEO_INIT mode.
+#   Uses the real data files if DAPP_BIRDS_FILE and DAPP_BIRDS_GEO_FILE are set (all modes),
+#   otherwise a generated species file and no geo data (lazy and background only)
+#   python tests/bench_startup.py
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from harness import DAPP_DIR, write_birds_file
+
+RUNS = 5
+
+class FakeRollupServer(BaseHTTPRequestHandler):
+    # the first /finish gets an inspect request, then there are no pending requests
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == "/finish":
+            if not self.server.inspect_sent:
+                self.server.inspect_sent = True
+                self.reply(200, {"request_type": "inspect_state", "data": {"payload": "0x"}})
+            else:
+                time.sleep(0.05)
+                self.reply(202, {})
+        else:
+            if self.path == "/report" and self.server.report_time is None:
+                self.server.report_time = time.monotonic()
+            self.reply(200, {})
+
+    def reply(self,status,json_data):
+        response = json.dumps(json_data).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self,*args):
+        pass
+
+class QuietHTTPServer(HTTPServer):
+    # the back-end is killed while waiting for /finish
+    def handle_error(self,request,client_address):
+        pass
+
+def time_to_first_request(env):
+    server = QuietHTTPServer(("127.0.0.1", 0), FakeRollupServer)
+    server.inspect_sent = False
+    server.report_time = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = dict(os.environ, ROLLUP_HTTP_SERVER_URL=f"http://127.0.0.1:{server.server_port}", DAPP_LOG_LEVEL="WARNING", **env)
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.join(DAPP_DIR, "ornithologist.py")], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while server.report_time is None:
+            if process.poll() is not None:
+                raise Exception(f"back-end exited with {process.returncode}")
+            time.sleep(0.005)
+    finally:
+        process.kill()
+        process.wait()
+        server.shutdown()
+    return server.report_time - start
+
+if __name__ == "__main__":
+    env = {}
+    modes = ["eager", "background", "lazy"]
+    if not (os.getenv("DAPP_BIRDS_FILE") and os.getenv("DAPP_BIRDS_GEO_FILE")):
+        data_dir = tempfile.mkdtemp(prefix="ornithologist-")
+        env["DAPP_BIRDS_FILE"] = os.path.join(data_dir, "birds_data.csv")
+        env["DAPP_BIRDS_GEO_FILE"] = os.path.join(data_dir, "missing.gpkg")
+        write_birds_file(env["DAPP_BIRDS_FILE"])
+        modes = ["background", "lazy"]
+
+    for mode in modes:
+        times = [time_to_first_request(dict(env, DAPP_GEO_INIT=mode)) for _ in range(RUNS)]
+        print(f"{mode:10} first request handled after {min(times):.2f}s (best of {RUNS})")
@@ -0,0 +1,8 @@
+import pytest
+
+from harness import load_ornithologist
+
+
+@pytest.fixture
+def ornithologist():
+    return load_ornithologist()
@@ -0,0 +1,113 @@
+# Loads a fresh ornithologist DApp module for tests and benchmarks, with a small
+#   generated species file, no geo data (DAPP_GEO_INIT=lazy) and rollup outputs
+#   captured in module.outputs instead of posted to the rollup server
+
+import os
+import json
+import shutil
+import tempfile
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+DAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUEL_TRAITS = ['complete.measures', 'beak.length_culmen', 'beak.length_nares', 'beak.width', 
+    'beak.depth', 'tarsus.length',  'wing.length', 'kipps.distance', 'secondary1', 'hand-wing.index', 
+    'tail.length', 'mass']
+N_SPECIES = 50
+
+def write_birds_file(path,n_species=N_SPECIES):
+    rng = np.random.default_rng(0)
+    birds_df = pd.DataFrame({
+        'key_0': [f"species {i}" for i in range(n_species)],
+        # some species codes have more than one row, as in the avonet join
+        'speciescode': [f"A{i // 2:03d}" for i in range(n_species)],
+        'density': rng.random(n_species),
+    })
+    for trait in DUEL_TRAITS:
+        birds_df[trait] = rng.random(n_species)
+        # last species has no measures, like some avonet rows
+        birds_df.loc[n_species - 1, trait] = np.nan
+        birds_df[f"{trait}.rank"] = birds_df[trait].rank(method='dense').fillna(-1).astype(int)
+    birds_df.to_csv(path)
+
+def load_ornithologist(**env):
+    data_dir = tempfile.mkdtemp(prefix="ornithologist-")
+    birds_file = os.path.join(data_dir, "birds_data.csv")
+    write_birds_file(birds_file)
+
+    os.environ.update({
+        "ROLLUP_HTTP_SERVER_URL": "http://127.0.0.1:5004",
+        "DAPP_BIRDS_FILE": birds_file,
+        "DAPP_BIRDS_GEO_FILE": os.path.join(data_dir, "birds_geo.gpkg"),
+        "DAPP_GEO_INIT": "lazy",
+        "DAPP_LOG_LEVEL": "WARNING",
+    })
+    for k in ("DAPP_MEMORY_BUDGET", "DAPP_ARCHIVE_FILE", "DAPP_EXPORT_FILE", "DAPP_ENCOUNTER_MODEL"):
+        os.environ.pop(k, None)
+    os.environ.update({k: str(v) for k,v in env.items()})
+
+    spec = importlib.util.spec_from_file_location("ornithologist", os.path.join(DAPP_DIR, "ornithologist.py"))
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        # the species file is only read at import
+        shutil.rmtree(data_dir)
+
+    module.outputs = []
+    module.send_post = lambda endpoint,json_data: module.outputs.append((endpoint, json_data))
+    module.bird_contract_address = "0x" + "b1" * 20
+    module.rollup_address = "0x" + "f0" * 20
+    return module
+
+class StubShapesTree:
+    # STRtree.query_items of Shapely 1.8 (the DApp version), by brute force
+    def __init__(self,shapes):
+        self.shapes = shapes
+
+    def query_items(self,geometry):
+        return [i for i,shape in enumerate(self.shapes) if shape.intersects(geometry)]
+
+class IdentityTransformer:
+    def transform(self,y,x):
+        return y,x
+
+def stub_geo(module,shapes,shapes_species_codes):
+    # geo data from shapes (in the geo file coordinates) and their species codes
+    from shapely.geometry import Point
+    module.Point = Point
+    module.transformer = IdentityTransformer()
+    module.shapes_tree = StubShapesTree(shapes)
+    module.shapes_species_bitsets = np.array([module.species_code_bitsets.get(code, module.EMPTY_SPECIES_BITSET) for code in shapes_species_codes],
+        dtype=np.uint64).reshape(len(shapes_species_codes), module.SPECIES_BITSET_WORDS)
+    module.geo_loaded = True
+
+def birdwatch(module,timestamp,summary):
+    data = {"metadata": {"msg_sender": module.bird_contract_address, "timestamp": timestamp, "block_number": 1, "epoch_index": 0, "input_index": 1},
+        "payload": module.binary2hex(bytes([module.BirdContractAction.BIRDWATCH.value]) + module.str2binary(json.dumps(summary)))}
+    return module.handle_advance(data)
+
+def advance(module,sender,timestamp,json_input):
+    data = {"metadata": {"msg_sender": sender, "timestamp": timestamp, "block_number": 1, "epoch_index": 0, "input_index": 1},
+        "payload": module.str2hex(json.dumps(json_input))}
+    return module.handle_advance(data)
+
+def inspect(module,payload):
+    module.handle_inspect({"payload": module.str2hex(payload)})
+    return module.hex2str(module.outputs[-1][1]["payload"])
+
+def get_rss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+def get_peak_rss():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
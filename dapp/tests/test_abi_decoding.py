@@ -0,0 +1,63 @@
+# The fast deposit decoders must return exactly what eth_abi.decode returns
+#   (or fail the same way) for any payload
+
+import random
+
+import pytest
+from eth_abi import decode, encode
+
+DEPOSIT_TYPES = {
+    'erc20_deposit_decoder': ['bytes32', 'address', 'address', 'uint256', 'bytes'],
+    'erc721_deposit_decoder': ['bytes32', 'address', 'address', 'address', 'uint256', 'bytes'],
+    'ether_deposit_decoder': ['bytes32', 'address', 'uint256', 'bytes'],
+}
+FUZZ_ROUNDS = 5000
+
+def random_value(rnd,abi_type):
+    if abi_type == 'bytes32':
+        return rnd.randbytes(32)
+    if abi_type == 'address':
+        return "0x" + rnd.randbytes(20).hex()
+    if abi_type == 'uint256':
+        return rnd.getrandbits(rnd.choice([8, 64, 256]))
+    return rnd.randbytes(rnd.choice([0, 1, 31, 32, 33, rnd.randint(0, 300)]))
+
+def mutate(rnd,binary):
+    binary = bytearray(binary)
+    for _ in range(rnd.randint(1, 4)):
+        binary[rnd.randrange(len(binary))] = rnd.randrange(256)
+    if rnd.random() < 0.2:
+        binary = binary[:rnd.randrange(len(binary))]
+    if rnd.random() < 0.1:
+        binary += rnd.randbytes(rnd.randint(1, 64))
+    return bytes(binary)
+
+def decode_or_error(decoder,binary):
+    try:
+        return decoder(binary)
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("decoder_name", DEPOSIT_TYPES.keys())
+def test_fast_decoder_matches_eth_abi(ornithologist,decoder_name):
+    types = DEPOSIT_TYPES[decoder_name]
+    fast_decoder = getattr(ornithologist, decoder_name)
+    rnd = random.Random(decoder_name)
+    for i in range(FUZZ_ROUNDS):
+        binary = encode(types, [random_value(rnd, t) for t in types])
+        if i % 2:
+            binary = mutate(rnd, binary)
+        expected = decode_or_error(lambda b: decode(types, b), binary)
+        assert decode_or_error(fast_decoder, memoryview(binary)) == expected, binary.hex()
+
+
+def test_erc721_deposit_from_hex_payload(ornithologist):
+    token_address = "0x" + "11" * 20
+    depositor = "0x" + "33" * 20
+    payload = ornithologist.binary2hex(encode(['bytes32', 'address', 'address', 'address', 'uint256', 'bytes'],
+        [ornithologist.ERC721_DEPOSIT_HEADER, token_address, "0x" + "22" * 20, depositor, 7, b"data"]))
+    binary = memoryview(ornithologist.hex2binary(payload))
+    assert ornithologist.abi_read_bytes32(binary, 0) == ornithologist.ERC721_DEPOSIT_HEADER
+    assert ornithologist.decode_erc721_deposit(binary) == {"token_address": token_address, "operator": "0x" + "22" * 20,
+        "depositor": depositor, "token_id": 7, "data": b"data"}
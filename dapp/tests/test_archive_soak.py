@@ -0,0 +1,124 @@
+# Soak test of the archive: the same long sequence of duels, withdrawals, mints and deposits
+#   with and without DAPP_MEMORY_BUDGET must give the same observable state, while the withdrawn
+#   birds in memory stay bounded. SOAK_ITERATIONS sets the length; the RSS and archive size are
+#   printed every SOAK_REPORT_EVERY iterations (pytest -s)
+
+import os
+import ast
+import json
+
+from harness import load_ornithologist, advance, inspect, get_rss
+
+SOAK_ITERATIONS = int(os.getenv("SOAK_ITERATIONS", 2000))
+SOAK_REPORT_EVERY = int(os.getenv("SOAK_REPORT_EVERY", 500))
+N_USERS = 20
+USER = "0x" + "01" * 20
+
+def soak(memory_budget,archive_file=None):
+    env = {"DAPP_MEMORY_BUDGET": memory_budget}
+    if archive_file:
+        env["DAPP_ARCHIVE_FILE"] = archive_file
+    ornithologist = load_ornithologist(**env)
+    users = [f"0x{i:040x}" for i in range(N_USERS)]
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    bird_ids = [] # creation order, to compare runs with different uuids
+    tracking = []
+    timestamp = 1000
+
+    def send(sender,json_input):
+        nonlocal timestamp
+        timestamp += 1
+        assert advance(ornithologist,sender,timestamp,json_input) == "accept", ornithologist.outputs[-1]
+
+    for i in range(SOAK_ITERATIONS):
+        user1,user2 = users[i % N_USERS],users[(i + 1) % N_USERS]
+        bird1 = ornithologist.Bird(user1,species_names[i % len(species_names)])
+        bird2 = ornithologist.Bird(user2,species_names[(i + 7) % len(species_names)])
+        bird_ids += [bird1.id, bird2.id]
+        send(user1,{"action": "duel", "opponent": user2, "trait": "mass", "commit": ornithologist.bird_commit_hash(bird1.id,"nonce")})
+        send(user2,{"action": "duel", "opponent": user1, "bird": bird2.id})
+        send(user1,{"action": "duel", "opponent": user2, "bird": bird1.id, "nonce": "nonce"})
+        send(user1,{"action": "withdraw", "birds": [bird1.id]})
+        if i % 100 == 0:
+            # minted after it left the DApp (possibly archived)
+            ornithologist.Bird.register_erc721_id(bird1.id,i)
+        if i % 100 == 50:
+            # deposited back (possibly from the archive)
+            ornithologist.Bird.deposit(user2,i - 50)
+        if (i + 1) % SOAK_REPORT_EVERY == 0:
+            withdrawn_in_memory = sum(b.location == ornithologist.Location.BASE_LAYER for b in ornithologist.Bird.list_by_id.values())
+            tracking.append((i + 1, get_rss(), ornithologist.Archive.size, withdrawn_in_memory))
+    return ornithologist,bird_ids,tracking
+
+def normalized_export(ornithologist,bird_ids):
+    bird_index = {bird_id: f"bird {i}" for i,bird_id in enumerate(bird_ids)}
+    export = []
+    for line in ornithologist.StateExport.iter_ndjson():
+        record = json.loads(line)
+        export.append({k: bird_index.get(v, v) if type(v) == str else v for k,v in record.items()})
+    return export
+
+
+def test_archive_keeps_observable_state(tmp_path):
+    reference,reference_ids,_ = soak(0)
+    archived,archived_ids,tracking = soak(1,str(tmp_path / "archive.bin"))
+
+    for iteration,rss,archive_size,withdrawn_in_memory in tracking:
+        print(f"iteration {iteration}: rss {rss}, archive size {archive_size}, withdrawn birds in memory {withdrawn_in_memory}")
+        assert withdrawn_in_memory <= archived.ARCHIVE_MIN_RECORDS
+
+    summary = ast.literal_eval(inspect(archived,"archive"))
+    assert summary['compactions'] > 0 and summary['archived_birds'] > 0 and summary['archived_duels'] > 0
+    print(f"archive summary {summary}")
+
+    # archived records leave no objects in memory, only packed index entries
+    in_memory = len(archived.Bird.list_by_id) + len(archived.Ornithologist.list_by_id) + len(archived.Tournament.list_by_id) \
+        + len(archived.Archive.cold_duels) + sum(len(o.duels) for o in archived.Ornithologist.list_by_id.values())
+    assert len(archived.StateExport.list_by_seq) <= in_memory
+    assert summary['index_size'] <= 3 * 16 * (summary['archived_birds'] + summary['archived_duels'] + SOAK_ITERATIONS // 100)
+    assert len(archived.Bird.list_by_id) < len(reference.Bird.list_by_id)
+    assert tracking[-1][2] > tracking[0][2]
+
+    # per ornithologist stats, encountered species summary and export are the same
+    for user in reference.Ornithologist.list_by_id:
+        assert archived.Ornithologist.list_by_id[user].to_export_dict() == reference.Ornithologist.list_by_id[user].to_export_dict()
+    assert ast.literal_eval(inspect(archived,"")) == ast.literal_eval(inspect(reference,""))
+    assert normalized_export(archived,archived_ids) == normalized_export(reference,reference_ids)
+
+
+def test_mint_after_compaction_keeps_bird_archived():
+    ornithologist,bird_ids,_ = soak(1)
+    archive = ornithologist.Archive
+    bird_id = next(b for b in bird_ids if archive.get_archived_bird(b) is not None and archive.get_archived_bird(b)['erc721_id'] is None)
+    assert ornithologist.Bird.list_by_id.get(bird_id) is None
+
+    archived_record = ornithologist.Bird.register_erc721_id(bird_id,10**9)
+    assert archived_record['erc721_id'] == 10**9
+    assert ornithologist.Bird.list_by_id.get(bird_id) is None
+    assert archive.get_bird_id_by_erc721_id(10**9) == bird_id
+    assert len(archive.read(bird_id)) >= 2
+    # the export has the new record, with a new seq
+    exported = [r for r in ornithologist.StateExport.iter_records(archived_record['seq'] - 1) if r['id'] == bird_id]
+    assert exported == [archived_record]
+
+    # deposited back, it leaves the archive and becomes the bird export record again
+    bird = ornithologist.Bird.deposit("0xdepositor",10**9)
+    assert bird.id == bird_id and bird.location == ornithologist.Location.DAPP
+    assert archive.get_archived_bird(bird_id) is None and bird_id not in archive.cold_birds
+    assert ornithologist.StateExport.list_by_seq[bird.seq] is bird
+    assert len(archive.read(bird_id)) >= 2
+
+
+def test_archive_file_is_opened_on_first_compaction(tmp_path):
+    archive_file = tmp_path / "archive.bin"
+    archive_file.write_bytes(b"previous archive")
+    ornithologist = load_ornithologist(DAPP_MEMORY_BUDGET=1, DAPP_ARCHIVE_FILE=str(archive_file))
+    assert ornithologist.Archive.region is None
+    assert archive_file.read_bytes() == b"previous archive"
+
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    for i in range(ornithologist.ARCHIVE_MIN_RECORDS):
+        ornithologist.Bird(USER,species_names[i % len(species_names)]).move_to_base_layer()
+    ornithologist.Archive.check_memory_budget()
+    assert ornithologist.Archive.compactions == 1
+    assert archive_file.stat().st_size == ornithologist.Archive.size
@@ -0,0 +1,65 @@
+# Replayed birdwatch claims are rejected by the claim index
+
+from shapely.geometry import Point
+
+from harness import load_ornithologist, stub_geo, birdwatch
+
+ACCOUNT = "0x" + "AB" * 20
+
+def with_geo(ornithologist):
+    codes = ornithologist.birds_df['speciescode'].unique().tolist()
+    stub_geo(ornithologist,[Point(0, 0).buffer(100)] * len(codes),codes)
+    return ornithologist
+
+def summary(i=0,account=ACCOUNT):
+    return {"x": i, "y": 0, "r": 10, "d": 1000, "t": 600, "a": account}
+
+def birds_of(ornithologist,account=ACCOUNT):
+    ornithologist_object = ornithologist.Ornithologist.list_by_id.get(account)
+    return len(ornithologist_object.bird_catalogue) if ornithologist_object else 0
+
+
+def test_replayed_claim_is_rejected(ornithologist):
+    with_geo(ornithologist)
+    assert birdwatch(ornithologist,100,summary()) == "accept"
+    assert birdwatch(ornithologist,101,summary()) == "reject"
+    assert birds_of(ornithologist) == 1
+    assert birdwatch(ornithologist,102,summary(1)) == "accept"
+
+
+def test_account_case_is_canonical(ornithologist):
+    with_geo(ornithologist)
+    assert birdwatch(ornithologist,100,summary()) == "accept"
+    assert birdwatch(ornithologist,101,summary(account=ACCOUNT.lower())) == "reject"
+    # keys order does not matter either
+    assert birdwatch(ornithologist,102,dict(reversed(list(summary().items())))) == "reject"
+    assert ornithologist.ClaimIndex.get_digest(summary()) == ornithologist.ClaimIndex.get_digest(summary(account=ACCOUNT.lower()))
+
+
+def test_claims_expire_by_timestamp():
+    ornithologist = with_geo(load_ornithologist(DAPP_CLAIM_INDEX_TIMEOUT=50))
+    assert birdwatch(ornithologist,100,summary()) == "accept"
+    assert birdwatch(ornithologist,149,summary()) == "reject"
+    assert birdwatch(ornithologist,150,summary()) == "accept"
+    assert birds_of(ornithologist) == 2
+
+
+def test_oldest_claims_are_evicted_by_size():
+    ornithologist = with_geo(load_ornithologist(DAPP_CLAIM_INDEX_SIZE=3))
+    for i in range(4):
+        assert birdwatch(ornithologist,100 + i,summary(i)) == "accept"
+    assert len(ornithologist.ClaimIndex.list_by_digest) <= 3
+    # the oldest claim was evicted, the newest are still rejected
+    assert birdwatch(ornithologist,110,summary(3)) == "reject"
+    assert birdwatch(ornithologist,111,summary(0)) == "accept"
+
+
+def test_claim_recorded_only_after_bird_is_created(ornithologist):
+    # no species region crosses the walk, so no bird can be created
+    stub_geo(ornithologist,[Point(1000, 1000).buffer(1)],["A000"])
+    assert birdwatch(ornithologist,100,summary()) == "reject"
+    assert len(ornithologist.ClaimIndex.list_by_digest) == 0
+
+    with_geo(ornithologist)
+    assert birdwatch(ornithologist,101,summary()) == "accept"
+    assert len(ornithologist.ClaimIndex.list_by_digest) == 1
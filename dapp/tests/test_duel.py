@@ -0,0 +1,52 @@
+# Duel resolution by trait rank
+
+from harness import advance
+
+USER1 = "0x" + "01" * 20
+USER2 = "0x" + "02" * 20
+TRAIT = 'mass'
+
+def duel(ornithologist,species1,species2):
+    bird1 = ornithologist.Bird(USER1,species1)
+    bird2 = ornithologist.Bird(USER2,species2)
+    assert advance(ornithologist,USER1,100,{"action": "duel", "opponent": USER2, "trait": TRAIT,
+        "commit": ornithologist.bird_commit_hash(bird1.id,"nonce")}) == "accept"
+    duel_id = ornithologist.Duel.generate_duel_id(USER1,USER2)
+    assert advance(ornithologist,USER2,101,{"action": "duel", "opponent": USER1, "bird": bird2.id}) == "accept"
+    assert advance(ornithologist,USER1,102,{"action": "duel", "opponent": USER2, "bird": bird1.id, "nonce": "nonce"}) == "accept"
+    finished = ornithologist.Ornithologist.list_by_id[USER1].duels[-1]
+    assert finished.id == duel_id and finished.finished
+    return finished,bird1,bird2
+
+def species_by_rank(ornithologist):
+    ranks = {s: r[TRAIT] for s,r in ornithologist.species_trait_ranks.items() if r[TRAIT] != ornithologist.MISSING_TRAIT_RANK}
+    return sorted(ranks, key=ranks.get)
+
+def missing_species(ornithologist):
+    return next(s for s,r in ornithologist.species_trait_ranks.items() if r[TRAIT] == ornithologist.MISSING_TRAIT_RANK)
+
+
+def test_higher_rank_wins(ornithologist):
+    species = species_by_rank(ornithologist)
+    finished,bird1,_ = duel(ornithologist,species[-1],species[0])
+    assert finished.winner == bird1.id and finished.winner_ornithologist == USER1
+
+
+def test_same_rank_is_a_draw(ornithologist):
+    species = species_by_rank(ornithologist)
+    finished,_,_ = duel(ornithologist,species[0],species[0])
+    assert finished.winner is None and finished.winner_ornithologist is None
+
+
+def test_missing_measure_loses(ornithologist):
+    species = species_by_rank(ornithologist)
+    # bird 2 is chosen after the trait is known, a species without the measure must not win
+    finished,bird1,_ = duel(ornithologist,species[0],missing_species(ornithologist))
+    assert finished.winner == bird1.id
+    finished,_,bird2 = duel(ornithologist,missing_species(ornithologist),species[0])
+    assert finished.winner == bird2.id
+
+
+def test_both_measures_missing_is_a_draw(ornithologist):
+    finished,_,_ = duel(ornithologist,missing_species(ornithologist),missing_species(ornithologist))
+    assert finished.winner is None and finished.winner_ornithologist is None
@@ -0,0 +1,90 @@
+# With DAPP_GEO_INIT=background or lazy, requests other than birdwatches are served before
+#   the geo data is loaded, and birdwatches wait for it. The geo modules are replaced by fakes
+#   whose fiona.open blocks until the test releases it
+
+import sys
+import types
+import threading
+
+import pytest
+
+from harness import load_ornithologist, advance, birdwatch, StubShapesTree, IdentityTransformer
+
+USER1 = "0x" + "01" * 20
+USER2 = "0x" + "02" * 20
+WAIT = 0.2 # seconds a blocked request is given to (wrongly) finish
+
+@pytest.fixture
+def geo_release(monkeypatch):
+    release = threading.Event()
+    opened = threading.Event()
+
+    def open_geo_file(path):
+        opened.set()
+        release.wait(10)
+        return [{'geometry': {'type': 'Polygon', 'coordinates': [[(-100, -100), (100, -100), (100, 100), (-100, 100)]]},
+            'properties': {'speciescodeEU': 'A000'}}]
+
+    fiona = types.ModuleType("fiona")
+    fiona.open = open_geo_file
+    pyproj = types.ModuleType("pyproj")
+    pyproj.Transformer = types.SimpleNamespace(from_crs=lambda *args: IdentityTransformer())
+    strtree = types.ModuleType("shapely.strtree")
+    strtree.STRtree = StubShapesTree
+    monkeypatch.setitem(sys.modules, "fiona", fiona)
+    monkeypatch.setitem(sys.modules, "pyproj", pyproj)
+    monkeypatch.setitem(sys.modules, "shapely.strtree", strtree)
+    release.opened = opened
+    yield release
+    release.set()
+
+def serves_other_requests(ornithologist):
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    bird1 = ornithologist.Bird(USER1,species_names[0])
+    ornithologist.Bird(USER2,species_names[1])
+    assert advance(ornithologist,USER1,100,{"action": "duel", "opponent": USER2, "trait": "mass",
+        "commit": ornithologist.bird_commit_hash(bird1.id,"nonce")}) == "accept"
+    assert ornithologist.handle_inspect({"payload": ornithologist.str2hex(bird1.id)}) == "accept"
+
+def start_birdwatch(ornithologist,results):
+    summary = {"x": 0, "y": 0, "r": 10, "d": 1000, "t": 600, "a": USER1}
+    thread = threading.Thread(target=lambda: results.append(birdwatch(ornithologist,200,summary)))
+    thread.start()
+    return thread
+
+
+def test_background_serves_requests_while_loading(geo_release):
+    ornithologist = load_ornithologist(DAPP_GEO_INIT="background")
+    assert geo_release.opened.wait(10)
+    assert not ornithologist.geo_loaded
+
+    serves_other_requests(ornithologist)
+    assert not ornithologist.geo_loaded
+
+    # the birdwatch waits on geo_lock, held by the warm-up thread
+    results = []
+    thread = start_birdwatch(ornithologist,results)
+    thread.join(WAIT)
+    assert thread.is_alive() and results == []
+
+    geo_release.set()
+    thread.join(10)
+    assert results == ["accept"]
+    assert ornithologist.geo_loaded
+
+
+def test_lazy_loads_on_first_birdwatch(geo_release):
+    ornithologist = load_ornithologist(DAPP_GEO_INIT="lazy")
+    serves_other_requests(ornithologist)
+    assert not ornithologist.geo_loaded and not geo_release.opened.is_set()
+
+    results = []
+    thread = start_birdwatch(ornithologist,results)
+    assert geo_release.opened.wait(10)
+    thread.join(WAIT)
+    assert thread.is_alive() and results == []
+
+    geo_release.set()
+    thread.join(10)
+    assert results == ["accept"]
+    assert ornithologist.geo_loaded
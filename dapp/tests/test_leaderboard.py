@@ -0,0 +1,27 @@
+# Per trait leaderboards of the birds in DApp
+
+import ast
+
+from harness import inspect
+
+TRAIT = 'mass'
+
+
+def test_leaderboard_order_and_updates(ornithologist):
+    ranks = {s: r[TRAIT] for s,r in ornithologist.species_trait_ranks.items()}
+    birds = [ornithologist.Bird(f"0x{i % 3:040x}",species) for i,species in enumerate(ranks)]
+    measured = [b for b in birds if ranks[b.species_name] != ornithologist.MISSING_TRAIT_RANK]
+
+    board = ast.literal_eval(inspect(ornithologist,f"leaderboard/{TRAIT}/5"))
+    assert board['birds'] == len(measured)
+    assert [e['rank'] for e in board['highest']] == sorted((ranks[b.species_name] for b in measured), reverse=True)[:5]
+    assert [e['rank'] for e in board['lowest']] == sorted(ranks[b.species_name] for b in measured)[:5]
+
+    # withdrawn birds leave the leaderboard
+    top = ornithologist.Bird.list_by_id[board['highest'][0]['bird']]
+    top.move_to_base_layer()
+    board = ast.literal_eval(inspect(ornithologist,f"leaderboard/{TRAIT}/1"))
+    assert board['birds'] == len(measured) - 1
+    assert board['highest'][0]['bird'] != top.id
+
+    assert ast.literal_eval(inspect(ornithologist,f"leaderboard/{TRAIT}/0"))['highest'] == []
@@ -0,0 +1,62 @@
+# Species sets as uint64 bitsets, and the birdwatch candidate species
+
+import numpy as np
+from numpy.random import Generator, PCG64
+from shapely.geometry import Point
+
+from harness import stub_geo, birdwatch
+
+ACCOUNT = "0x" + "0a" * 20
+
+def random_masks(ornithologist,n):
+    rng = np.random.default_rng(1)
+    return [rng.random(len(ornithologist.birds_df)) < p for p in np.linspace(0, 1, n)]
+
+
+def test_bitset_round_trip(ornithologist):
+    assert ornithologist.bitset_species(ornithologist.EMPTY_SPECIES_BITSET).tolist() == []
+    for mask in random_masks(ornithologist,20):
+        bitset = ornithologist.species_bitset(mask)
+        assert bitset.dtype == np.uint64 and len(bitset) == ornithologist.SPECIES_BITSET_WORDS
+        assert ornithologist.bitset_species(bitset).tolist() == np.flatnonzero(mask).tolist()
+
+
+def test_union_of_shape_bitsets(ornithologist):
+    masks = random_masks(ornithologist,8)
+    bitsets = np.array([ornithologist.species_bitset(m) for m in masks])
+    union = np.bitwise_or.reduce(bitsets, axis=0)
+    assert ornithologist.bitset_species(union).tolist() == np.flatnonzero(np.logical_or.reduce(masks)).tolist()
+
+
+def isin_birdwatch_species(ornithologist,shapes,shapes_species_codes,summary):
+    # the previous selection: species codes of the crossed shapes, then an isin scan of birds_df
+    walk_region = Point(summary['x'],summary['y']).buffer(summary['r'])
+    codes_in_area = list(set(code for shape,code in zip(shapes,shapes_species_codes) if shape.intersects(walk_region)))
+    birds_df = ornithologist.birds_df
+    possible_birds = birds_df[birds_df['speciescode'].isin(codes_in_area)]
+    probabilities = possible_birds['density'].values / sum(possible_birds['density'])
+    rnd_generator = Generator(PCG64(ornithologist.random_seed))
+    chosen = list(set(rnd_generator.choice(possible_birds.index,p=probabilities) for _ in range(int(summary['t'] / ornithologist.ENCOUNTER_INTERVAL))))
+    chosen_birds = possible_birds.loc[chosen]
+    return np.flatnonzero(birds_df['speciescode'].isin(codes_in_area)), \
+        chosen_birds[chosen_birds['density'].min() == chosen_birds['density']]['key_0'].iloc[0]
+
+
+def test_birdwatch_matches_isin_selection(ornithologist):
+    codes = ornithologist.birds_df['speciescode'].unique().tolist()
+    # overlapping species regions on a line, plus a code missing from the species file
+    shapes = [Point(i * 10, 0).buffer(15) for i in range(len(codes) + 1)]
+    shapes_species_codes = codes + ["UNKNOWN"]
+    stub_geo(ornithologist,shapes,shapes_species_codes)
+
+    for i,x in enumerate([0, 45, 100, 160, 250]):
+        summary = {"x": x, "y": 0, "r": 5 + i * 10, "d": 1000, "t": 3600, "a": ACCOUNT}
+        expected_rows,expected_species = isin_birdwatch_species(ornithologist,shapes,shapes_species_codes,summary)
+
+        crossed = ornithologist.shapes_tree.query_items(Point(x, 0).buffer(summary['r']))
+        rows = ornithologist.bitset_species(np.bitwise_or.reduce(ornithologist.shapes_species_bitsets[crossed], axis=0))
+        assert rows.tolist() == expected_rows.tolist()
+
+        assert birdwatch(ornithologist,100 + i,summary) == "accept"
+        bird = list(ornithologist.Ornithologist.list_by_id[ACCOUNT].bird_catalogue.values())[-1]
+        assert bird.species_name == expected_species
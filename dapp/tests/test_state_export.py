@@ -0,0 +1,75 @@
+# The export streams records one line at a time, so its memory does not grow with the state
+#   (EXPORT_TEST_BIRDS sets the number of birds, default 10^6)
+
+import os
+import json
+import random
+
+from harness import get_rss, reset_peak_rss, get_peak_rss
+
+N_BIRDS = int(os.getenv("EXPORT_TEST_BIRDS", 10**6))
+N_ORNITHOLOGISTS = 10
+MAX_EXPORT_MEMORY = 32 * 1024 * 1024
+MAX_LINE_LENGTH = 1024
+
+def add_birds(ornithologist,n):
+    # cheaper than Bird(), which also updates the leaderboards
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    owners = [ornithologist.Ornithologist.get_ornithologist(f"0x{i:040x}") for i in range(N_ORNITHOLOGISTS)]
+    for i in range(n):
+        owner = owners[i % N_ORNITHOLOGISTS]
+        bird = ornithologist.Bird.build(f"bird-{i}",owner.address,species_names[i % len(species_names)],ornithologist.Location.DAPP)
+        ornithologist.Bird.list_by_id[bird.id] = bird
+        owner.bird_catalogue[bird.id] = bird
+        ornithologist.StateExport.touch(bird)
+    for owner in owners:
+        ornithologist.StateExport.touch(owner)
+
+
+def test_export_memory_is_bounded(ornithologist,tmp_path):
+    add_birds(ornithologist,N_BIRDS)
+    export_path = tmp_path / "export.ndjson"
+
+    rss = get_rss()
+    reset_peak_rss()
+    lines = ornithologist.StateExport.write_file(export_path)
+    peak = get_peak_rss()
+
+    assert lines == N_BIRDS + N_ORNITHOLOGISTS
+    assert peak - rss < MAX_EXPORT_MEMORY
+    with open(export_path) as export_file:
+        owned = 0
+        for line in export_file:
+            assert len(line) < MAX_LINE_LENGTH
+            record = json.loads(line)
+            if record['type'] == 'ornithologist':
+                assert record['birds'] == N_BIRDS // N_ORNITHOLOGISTS
+            else:
+                owned += record['ornithologist'] is not None
+    assert owned == N_BIRDS
+
+
+def test_export_pages_follow_seq(ornithologist):
+    add_birds(ornithologist,250)
+    first_page = [json.loads(line) for line in ornithologist.StateExport.get_page(0,100).splitlines()]
+    assert len(first_page) == 100
+    next_page = [json.loads(line) for line in ornithologist.StateExport.get_page(first_page[-1]['seq'],100).splitlines()]
+    assert next_page[0]['seq'] > first_page[-1]['seq']
+    assert [r['seq'] for r in first_page + next_page] == sorted(r['seq'] for r in first_page + next_page)
+
+
+def test_export_seeks_past_superseded_seqs(ornithologist):
+    ornithologist.EXPORT_BLOCK_SIZE = 4
+    add_birds(ornithologist,50)
+    birds = list(ornithologist.Bird.list_by_id.values())
+    rng = random.Random(0)
+    for _ in range(500):
+        ornithologist.StateExport.touch(rng.choice(birds))
+    export = ornithologist.StateExport
+    live = sorted(export.list_by_seq)
+    assert len(live) == len(birds) + N_ORNITHOLOGISTS
+    assert list(export.iter_seqs()) == live
+    for since in [0, 1, live[0], live[len(live) // 2], live[-1] - 1, live[-1], export.seq + 10]:
+        assert [r['seq'] for r in export.iter_records(since)] == [seq for seq in live if seq > since]
+    # blocks hold only live seqs
+    assert sum(len(b) for b in export.seq_blocks) == len(live)
@@ -0,0 +1,76 @@
+# Tournament round-robin resolution
+
+TRAIT = 'wing.length'
+ENTRY_DEADLINE = 100 + 10
+REVEAL_DEADLINE = ENTRY_DEADLINE + 10
+
+def play(ornithologist,species_names):
+    tournament = ornithologist.Tournament(100,"0xcreator",TRAIT,True,10,10)
+    for i,species_name in enumerate(species_names):
+        address = f"0x{i:040x}"
+        bird = ornithologist.Bird(address,species_name)
+        tournament.add_entry(101,address,ornithologist.bird_commit_hash(bird.id,"nonce"))
+    for address in tournament.commits:
+        bird_id = next(iter(ornithologist.Ornithologist.get_ornithologist(address).bird_catalogue))
+        tournament.add_reveal(ENTRY_DEADLINE,address,bird_id,"nonce")
+    tournament.resolve(REVEAL_DEADLINE)
+    return tournament
+
+def species_by_rank(ornithologist):
+    ranks = {s: r[TRAIT] for s,r in ornithologist.species_trait_ranks.items() if r[TRAIT] != ornithologist.MISSING_TRAIT_RANK}
+    return sorted(ranks, key=ranks.get)
+
+
+def test_bird_with_most_wins_is_the_winner(ornithologist):
+    species = species_by_rank(ornithologist)
+    tournament = play(ornithologist,[species[0], species[1], species[-1]])
+    winner = ornithologist.Bird.list_by_id[tournament.winner]
+    assert winner.species_name == species[-1]
+    assert tournament.winner_ornithologist == winner.ornithologist
+    assert sorted(tournament.scores.values()) == [0, 1, 2]
+    assert "'status': 'finished'" in str(tournament)
+
+
+def test_tie_for_most_wins_has_no_winner(ornithologist):
+    species = species_by_rank(ornithologist)
+    tournament = play(ornithologist,[species[0], species[-1], species[-1]])
+    assert tournament.winner is None
+    assert tournament.winner_ornithologist is None
+    assert sorted(tournament.scores.values()) == [0, 1, 1]
+
+
+def test_missing_measure_forfeits(ornithologist):
+    species = species_by_rank(ornithologist)
+    missing = next(s for s,r in ornithologist.species_trait_ranks.items() if r[TRAIT] == ornithologist.MISSING_TRAIT_RANK)
+    tournament = play(ornithologist,[species[0], species[1], missing])
+    assert len(tournament.scores) == 2
+    assert ornithologist.Bird.list_by_id[tournament.winner].species_name == species[1]
+
+
+def test_open_tournament_status(ornithologist):
+    tournament = ornithologist.Tournament(100,"0xcreator",TRAIT,True,10,10)
+    assert "'status': 'open'" in str(tournament)
+
+
+def test_single_valid_entrant_has_no_winner(ornithologist):
+    species = species_by_rank(ornithologist)
+    tournament = play(ornithologist,[species[0]])
+    assert tournament.winner is None
+    assert list(tournament.scores.values()) == [0]
+
+
+def test_wins_match_pairwise_comparison(ornithologist):
+    species = species_by_rank(ornithologist)
+    entries = [species[i * 7 % len(species)] for i in range(40)]
+    for compare_greater in (True, False):
+        tournament = ornithologist.Tournament(100,f"0xcreator{compare_greater}",TRAIT,compare_greater,10,10)
+        birds = [ornithologist.Bird(f"0x{compare_greater:020x}{i:020x}",s) for i,s in enumerate(entries)]
+        for bird in birds:
+            tournament.add_entry(101,bird.ornithologist,ornithologist.bird_commit_hash(bird.id,"nonce"))
+        for bird in birds:
+            tournament.add_reveal(ENTRY_DEADLINE,bird.ornithologist,bird.id,"nonce")
+        tournament.resolve(REVEAL_DEADLINE)
+        for bird in birds:
+            rank = bird.get_trait_rank(TRAIT)
+            beaten = [b for b in birds if (b.get_trait_rank(TRAIT) < rank if compare_greater else b.get_trait_rank(TRAIT) > rank)]
+            assert tournament.scores[bird.id] == len(beaten)
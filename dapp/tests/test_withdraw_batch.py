@@ -0,0 +1,74 @@
+# Bulk withdraw: all listed birds are validated before any voucher is generated
+
+from eth_abi import decode
+
+from harness import advance
+
+USER = "0x" + "01" * 20
+OTHER = "0x" + "02" * 20
+
+def vouchers(ornithologist):
+    return [data for endpoint,data in ornithologist.outputs if endpoint == "voucher"]
+
+def decode_voucher(ornithologist,voucher,selector,types):
+    binary = ornithologist.hex2binary(voucher["payload"])
+    assert binary[:4] == selector
+    return decode(types, binary[4:])
+
+def add_birds(ornithologist,owner,n):
+    species_names = list(ornithologist.species_trait_ranks.keys())
+    return [ornithologist.Bird(owner,species_names[i % len(species_names)]) for i in range(n)]
+
+def assert_rejected(ornithologist,sender,birds_payload,birds):
+    assert advance(ornithologist,sender,100,{"action": "withdraw", "birds": birds_payload}) == "reject"
+    assert vouchers(ornithologist) == []
+    assert all(b.location == ornithologist.Location.DAPP for b in birds)
+
+
+def test_reject_when_any_bird_is_not_owned(ornithologist):
+    birds = add_birds(ornithologist,USER,3)
+    others = add_birds(ornithologist,OTHER,1)
+    assert_rejected(ornithologist,USER,[b.id for b in birds + others],birds + others)
+    assert_rejected(ornithologist,USER,[birds[0].id, "unknown bird"],birds)
+
+
+def test_reject_invalid_payload(ornithologist):
+    birds = add_birds(ornithologist,USER,2)
+    assert_rejected(ornithologist,USER,birds[0].id,birds)
+    assert_rejected(ornithologist,USER,[],birds)
+    assert_rejected(ornithologist,USER,[birds[0].id, birds[1].id, birds[0].id],birds)
+
+
+def test_mint_batch_chunks(ornithologist):
+    n = 2 * ornithologist.MINT_BATCH_SIZE + 3
+    birds = add_birds(ornithologist,USER,n)
+    assert advance(ornithologist,USER,100,{"action": "withdraw", "birds": [b.id for b in birds]}) == "accept"
+
+    minted = []
+    batches = vouchers(ornithologist)
+    assert len(batches) == 3
+    for voucher in batches:
+        assert voucher["address"] == ornithologist.bird_contract_address
+        receiver,bird_ids = decode_voucher(ornithologist,voucher,ornithologist.BIRD_MINTBATCH_FUNCTION_SELECTOR,['address', 'string[]'])
+        assert receiver == USER
+        assert len(bird_ids) <= ornithologist.MINT_BATCH_SIZE
+        minted += bird_ids
+    assert minted == [b.id for b in birds]
+    assert all(b.location == ornithologist.Location.BASE_LAYER for b in birds)
+    assert len(ornithologist.Ornithologist.list_by_id[USER].bird_catalogue) == 0
+
+
+def test_minted_birds_are_transferred(ornithologist):
+    birds = add_birds(ornithologist,USER,4)
+    for token_id,bird in enumerate(birds[:2]):
+        ornithologist.Bird.register_erc721_id(bird.id,token_id)
+    assert advance(ornithologist,USER,100,{"action": "withdraw", "birds": [b.id for b in birds]}) == "accept"
+
+    mint_batch,*transfers = vouchers(ornithologist)
+    _,bird_ids = decode_voucher(ornithologist,mint_batch,ornithologist.BIRD_MINTBATCH_FUNCTION_SELECTOR,['address', 'string[]'])
+    assert list(bird_ids) == [b.id for b in birds[2:]]
+    assert len(transfers) == 2
+    for token_id,voucher in enumerate(transfers):
+        sender,receiver,transferred = decode_voucher(ornithologist,voucher,ornithologist.ERC721_SAFETRANSFER_FUNCTION_SELECTOR,
+            ['address', 'address', 'uint256'])
+        assert (sender,receiver,transferred) == (ornithologist.rollup_address,USER,token_id)
@@ -93,5 +93,12 @@ contract Birds is Ownable, ERC721URIStorage {
 
         return IInput(this.owner()).addInput(input);
     }
+
+    // Mint several birds to the same recipient in a single voucher
+    function mintBatch(address recipient, string[] memory birdIds) public onlyOwner {
+        for (uint256 i = 0; i < birdIds.length; i++) {
+            mint(recipient, birdIds[i]);
+        }
+    }
     
 }
\ No newline at end of file